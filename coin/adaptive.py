@@ -0,0 +1,149 @@
+"""
+Adaptive triangulation of relief heightmaps.
+
+A regular grid spends two triangles on every cell, flat field or not. Here
+the heightmap is meshed as a right-triangulated irregular network, as
+terrain meshers do: the grid square is split along its diagonal, and every
+right triangle is halved through the midpoint of its hypotenuse while the
+heightmap strays from its plane by more than max_error vertically.
+
+The error of a triangle is the largest vertical distance of the samples it
+covers from its plane, raised to the errors of its halves and stored at the
+midpoint of its hypotenuse. The two triangles sharing a hypotenuse then
+split together, so the mesh has no T-junctions. Triangles over a cell
+outside the valid quads always split, and of the smallest triangles only
+the halves of valid quads are kept, so the mesh covers exactly what the
+regular grid does.
+
+All triangles of one level are congruent, so for each of their few
+orientations the covered samples sit at the same offsets, and one gather
+per orientation measures a whole level.
+"""
+
+import numpy as np
+
+def _levels(size):
+    """Corners (a, b, c) as (T, 2) x, y arrays for every level of bisection on a size x size grid
+
+    size must be 2^k + 1. c is the right-angle corner and a-b the
+    hypotenuse; the halves of triangle i of a level are triangles i and
+    i + T of the next one. The last level holds the halves of the grid cells.
+    """
+    n = size - 1
+    a = np.array([[0, 0], [n, n]], dtype=np.int32)
+    b = np.array([[n, n], [0, 0]], dtype=np.int32)
+    c = np.array([[0, n], [n, 0]], dtype=np.int32)
+    levels = [(a, b, c)]
+    while not np.any((a[0] + b[0]) % 2):
+        m = (a + b) // 2
+        a, b, c = np.concatenate([c, b]), np.concatenate([a, c]), np.concatenate([m, m])
+        levels.append((a, b, c))
+    return levels
+
+def _plane_errors(heights, a, b, c):
+    """Largest vertical distance of the samples inside each triangle from the plane through its corners"""
+    size = heights.shape[0]
+    flat = heights.ravel()
+    errors = np.empty(len(a))
+    ua = a - c
+    ub = b - c
+
+    # The legs of congruent triangles differ only in their directions
+    direction = np.sign(np.concatenate([ua, ub], axis=1)) + 1
+    kind = ((direction[:, 0] * 3 + direction[:, 1]) * 3 + direction[:, 2]) * 3 + direction[:, 3]
+    for k in np.flatnonzero(np.bincount(kind)):
+        group = np.flatnonzero(kind == k)
+        ax, ay = ua[group[0]]
+        bx, by = ub[group[0]]
+
+        # Sample offsets from c inside the triangle, with their plane weights
+        lo = np.minimum(0, np.minimum([ax, ay], [bx, by]))
+        hi = np.maximum(0, np.maximum([ax, ay], [bx, by]))
+        oy, ox = np.mgrid[lo[1]:hi[1] + 1, lo[0]:hi[0] + 1]
+        alpha = (ox * ax + oy * ay) / (ax * ax + ay * ay)
+        beta = (ox * bx + oy * by) / (bx * bx + by * by)
+        inside = (alpha >= 0) & (beta >= 0) & (alpha + beta <= 1)
+        offset = (oy * size + ox)[inside]
+        alpha = alpha[inside]
+        beta = beta[inside]
+
+        at_c = c[group, 1] * size + c[group, 0]
+        hc = flat[at_c]
+        ha = flat[a[group, 1] * size + a[group, 0]] - hc
+        hb = flat[b[group, 1] * size + b[group, 0]] - hc
+        plane = hc[:, None] + ha[:, None] * alpha + hb[:, None] * beta
+        errors[group] = np.abs(flat[at_c[:, None] + offset] - plane).max(axis=1)
+    return errors
+
+def triangulate(heights, quads, max_error):
+    """Adaptive triangles of a heightmap as (F, 3) flat sample indices, counter-clockwise seen from +Z
+
+    heights is a square samples x samples array, finite wherever quads (the
+    (samples - 1)^2 cells to mesh) is set. max_error is in the units of heights.
+    """
+    samples = heights.shape[0]
+    size = 2
+    while size < samples:
+        size = 2 * size - 1
+    padded = np.zeros((size, size))
+    padded[:samples, :samples] = np.where(np.isfinite(heights), heights, 0.0)
+    cells = np.zeros((size - 1, size - 1), dtype=bool)
+    cells[:samples - 1, :samples - 1] = quads
+
+    levels = _levels(size)
+
+    # Errors from the smallest triangles up, each level raised to its halves
+    errors = np.zeros(size * size)
+    valid = None
+    for depth in range(len(levels) - 1, -1, -1):
+        a, b, c = levels[depth]
+        if valid is None:
+            corner = np.minimum(np.minimum(a, b), c)
+            valid = cells[corner[:, 1], corner[:, 0]]
+            finest = valid
+            continue
+        half = len(a)
+        valid = valid[:half] & valid[half:]
+
+        error = np.full(len(a), np.inf)
+        error[valid] = _plane_errors(padded, a[valid], b[valid], c[valid])
+        if depth < len(levels) - 2:
+            left = (c + a) // 2
+            right = (b + c) // 2
+            error = np.maximum(error, np.maximum(errors[left[:, 1] * size + left[:, 0]],
+                                                 errors[right[:, 1] * size + right[:, 0]]))
+        m = (a + b) // 2
+        np.maximum.at(errors, m[:, 1] * size + m[:, 0], error)
+
+    # Walk down from the two largest triangles, keeping those within max_error
+    kept = []
+    active = np.arange(2)
+    for depth, (a, b, c) in enumerate(levels):
+        if depth == len(levels) - 1:
+            active = active[finest[active]]
+            kept.append(np.stack([a[active], b[active], c[active]], axis=1))
+            break
+        m = (a[active] + b[active]) // 2
+        split = errors[m[:, 1] * size + m[:, 0]] > max_error
+        done = active[~split]
+        kept.append(np.stack([a[done], b[done], c[done]], axis=1))
+        active = np.concatenate([active[split], active[split] + len(a)])
+
+    corners = np.concatenate(kept)
+    x = corners[..., 0]
+    y = corners[..., 1]
+    faces = y * samples + x
+    clockwise = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0]) < 0
+    faces[clockwise] = faces[clockwise][:, ::-1]
+    return faces
+
+def boundary_edges(faces):
+    """Directed edges (start, end) of consistently wound faces that no face uses the other way"""
+    start = faces.ravel()
+    end = faces[:, [1, 2, 0]].ravel()
+    count = int(faces.max()) + 1 if len(faces) else 0
+    reverse = np.sort(end * count + start)
+    forward = start * count + end
+    at = np.minimum(np.searchsorted(reverse, forward), max(len(reverse) - 1, 0))
+    lone = reverse[at] != forward
+    return start[lone], end[lone]
@@ -0,0 +1,130 @@
+"""
+Batch manifests for the coin scripts.
+
+A manifest is a JSON list of objects, or a CSV file with a header row, with
+one coin per entry:
+
+    [{"input": "head.usda", "output": "head_a.stl", "diameter": 40,
+      "depth": 2, "rotate_x": 90, "rotate_y": 0, "rotate_z": 15}, ...]
+
+Fields left out take their value from the command line, except output: a
+job without one is named after its input, with the extension of --output
+(head.usda -> head.stl), numbered when several jobs would share that name.
+Two jobs writing the same file are an error. Relative paths are resolved
+against the manifest's directory.
+"""
+
+import os
+import csv
+import json
+
+def flag(value):
+    """Boolean manifest value: JSON true/false, or 1/0, yes/no, true/false in CSV"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'yes', 'true'):
+        return True
+    if text in ('0', 'no', 'false'):
+        return False
+    raise ValueError(f"Not a yes/no value: '{value}'")
+
+# Values of --method
+METHODS = ('projection', 'heightmap')
+
+def method(value):
+    """Relief method name, one of METHODS"""
+    if value not in METHODS:
+        raise ValueError(f"Unknown method '{value}': use {' or '.join(METHODS)}")
+    return value
+
+# Manifest field -> (parse_args key, type)
+FIELDS = {
+    'input': ('input', str),
+    'output': ('output', str),
+    'diameter': ('coin_diameter', float),
+    'depth': ('relief_depth', float),
+    'rotate_x': ('rotation_x', float),
+    'rotate_y': ('rotation_y', float),
+    'rotate_z': ('rotation_z', float),
+    'samples': ('samples', int),
+    'method': ('method', method),
+    'compress': ('compress', str),
+    'max_error': ('max_error', float),
+    'combine': ('combine', str),
+    'cut': ('cut', str),
+    'cut_height': ('cut_height', float),
+    'cull': ('cull', flag),
+    'tolerance': ('tolerance', float),
+    'auto_orient': ('auto_orient', flag),
+    'clean': ('clean', flag),
+    'layer_height': ('layer_height', float),
+    'back': ('back', str),
+    'back_rotate_x': ('back_rotation_x', float),
+    'back_rotate_y': ('back_rotation_y', float),
+    'back_rotate_z': ('back_rotation_z', float),
+}
+
+def read_manifest(filepath, defaults):
+    """Read a manifest into a list of argument dicts based on defaults"""
+    with open(filepath, newline='') as fh:
+        if filepath.lower().endswith('.csv'):
+            rows = list(csv.DictReader(fh))
+        else:
+            rows = json.load(fh)
+            if isinstance(rows, dict):
+                rows = rows.get('jobs', [])
+
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    extension = os.path.splitext(defaults['output'] or '')[1] or '.stl'
+    jobs = []
+    named = []
+    for n, row in enumerate(rows, 1):
+        job = dict(defaults)
+        job['jobs'] = None
+        for field, value in row.items():
+            if field not in FIELDS:
+                raise ValueError(f"Job {n}: unknown field '{field}'")
+            if value is None or value == '':
+                continue
+            key, convert = FIELDS[field]
+            job[key] = convert(value)
+
+        if not job['input']:
+            raise ValueError(f"Job {n}: input is required")
+        named.append(row.get('output') not in (None, ''))
+        if not named[-1]:
+            job['output'] = os.path.splitext(os.path.basename(job['input']))[0] + extension
+        for key in ('input', 'output', 'back'):
+            if job[key]:
+                job[key] = os.path.join(base_dir, os.path.expanduser(job[key]))
+        jobs.append(job)
+
+    # Number the outputs named after a shared input, then check none clash
+    shared = {}
+    for job in jobs:
+        shared[job['output']] = shared.get(job['output'], 0) + 1
+    for n, (job, given) in enumerate(zip(jobs, named), 1):
+        if not given and shared[job['output']] > 1:
+            root, ext = os.path.splitext(job['output'])
+            job['output'] = f"{root}_{n}{ext}"
+    writer = {}
+    for n, job in enumerate(jobs, 1):
+        if job['output'] in writer:
+            raise ValueError(f"Jobs {writer[job['output']]} and {n} both write {job['output']}")
+        writer[job['output']] = n
+    return jobs
+
+def group_by_input(jobs):
+    """Jobs grouped by input file, in order of first appearance"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job['input'], []).append(job)
+    return groups
+
+def group_by_import(jobs):
+    """Jobs grouped by what their import yields, (input, clean), in order of first appearance"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job['input'], job['clean']), []).append(job)
+    return groups
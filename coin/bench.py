@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Stage-level benchmark for the coin pipeline.
+
+Usage:
+    python3 bench.py [--sizes 10k,100k,1m,5m] [--output bench.json] [--baseline baseline.json]
+    blender --background --python bench.py -- [same options]
+
+Runs every stage of the pipeline separately on mark.usda, coin.stl and
+synthetic bumpy spheres of the given vertex counts, recording wall time,
+peak RSS and output triangle count per stage. Under plain Python the
+stages are those of relief.py; under Blender they are the bpy stages of the
+coin scripts (import_usd, join, read_buffer, projection, write_buffer,
+create_coin_base, combine_relief_with_base, stl_export). The bisect stage
+is only timed where the cut closes the back; an open relief such as that
+of mark.usda cannot be capped and skips it.
+
+Results are written as JSON. With --baseline they are compared stage by
+stage against an earlier results file and the exit status is 1 when a
+stage got slower than --threshold times its baseline time.
+--save-baseline writes the results to the baseline file instead.
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import platform
+import tempfile
+import threading
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import heightmap
+import meshbuffer
+import relief
+import slicer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUTS = [os.path.join(HERE, "mark.usda"), os.path.join(HERE, "coin.stl")]
+DEFAULT_SIZES = "10k,100k,1m,5m"
+
+# Stages faster than this are too noisy to call a regression
+MIN_SECONDS = 0.01
+
+# Settings every stage runs with
+SETTINGS = {
+    'coin_diameter': 40.0,
+    'relief_depth': 2.0,
+    'rotation': {'x': 90.0, 'y': 0.0, 'z': 0.0},
+    'samples': 512,
+    'cut_height': 0.2,  # mm, as slicer.py cuts by default
+}
+
+def parse_size(text):
+    """Vertex count from '10k', '1m' or a plain number"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+def parse_args(argv=None):
+    """Benchmark options (after '--' when run inside Blender)"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+
+    args = {
+        'inputs': [],           # default: DEFAULT_INPUTS
+        'sizes': DEFAULT_SIZES,
+        'output': 'bench.json',
+        'baseline': None,
+        'save_baseline': False,
+        'threshold': 1.2,       # allowed slowdown against the baseline
+        'repeat': 1,            # best of N for wall time
+    }
+
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--input' and i + 1 < len(argv):
+            args['inputs'].append(argv[i + 1])
+            i += 2
+        elif argv[i] == '--sizes' and i + 1 < len(argv):
+            args['sizes'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--output' and i + 1 < len(argv):
+            args['output'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--baseline' and i + 1 < len(argv):
+            args['baseline'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--threshold' and i + 1 < len(argv):
+            args['threshold'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--repeat' and i + 1 < len(argv):
+            args['repeat'] = int(argv[i + 1])
+            i += 2
+        elif argv[i] == '--save-baseline':
+            args['save_baseline'] = True
+            i += 1
+        else:
+            i += 1
+
+    args['inputs'] = args['inputs'] or list(DEFAULT_INPUTS)
+    args['sizes'] = [parse_size(s) for s in args['sizes'].split(',') if s.strip()]
+    return args
+
+# --- Synthetic inputs ---
+
+def synthetic_mesh(vertices):
+    """Closed bumpy sphere with about the given number of vertices"""
+    rows = max(int(math.sqrt(vertices / 2)), 3)
+    cols = 2 * rows
+    theta = np.linspace(0, math.pi, rows + 1)[1:-1]
+    phi = np.arange(cols) * (2 * math.pi / cols)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    r = 1.0 + 0.05 * np.sin(7 * t) * np.sin(5 * p) + 0.02 * np.sin(23 * t) * np.cos(17 * p)
+
+    verts = np.concatenate([
+        [(0, 0, 1)],
+        np.stack([r * np.sin(t) * np.cos(p), r * np.sin(t) * np.sin(p), r * np.cos(t)], axis=-1).reshape(-1, 3),
+        [(0, 0, -1)],
+    ])
+
+    ring = np.arange(cols)
+    ring1 = (ring + 1) % cols
+    a = 1 + np.arange(rows - 2)[:, None] * cols
+    b = a + cols
+    bottom = len(verts) - 1
+    last = 1 + (rows - 2) * cols
+    faces = np.concatenate([
+        np.stack([np.zeros(cols, dtype=np.int64), 1 + ring, 1 + ring1], axis=1),
+        np.stack([a + ring, b + ring, b + ring1], axis=-1).reshape(-1, 3),
+        np.stack([a + ring, b + ring1, a + ring1], axis=-1).reshape(-1, 3),
+        np.stack([np.full(cols, bottom), last + ring1, last + ring], axis=1),
+    ])
+    return verts * 50.0, faces
+
+def write_usda(filepath, verts, faces):
+    """Minimal Z-up .usda holding one triangle mesh"""
+    with open(filepath, 'w') as fh:
+        fh.write('#usda 1.0\n(\n    metersPerUnit = 1\n    upAxis = "Z"\n)\n\n')
+        fh.write('def Mesh "Synthetic"\n{\n')
+        fh.write('    int[] faceVertexCounts = [')
+        fh.write(', '.join(['3'] * len(faces)))
+        fh.write(']\n    int[] faceVertexIndices = [')
+        np.savetxt(fh, np.asarray(faces).reshape(1, -1), fmt='%d', delimiter=', ', newline='')
+        fh.write(']\n    point3f[] points = [')
+        np.savetxt(fh, verts, fmt='(%.5f, %.5f, %.5f)', newline=', ')
+        fh.write(']\n}\n')
+
+# --- Measurement ---
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def max_rss():
+    """Peak resident set size of the process so far, in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class PeakRSS:
+    """Track the peak RSS while the with-block runs by sampling in a thread"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def __enter__(self):
+        self._before = max_rss()
+        self.peak = current_rss() or 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss() or 0)
+        # The sampler can miss peaks inside calls that hold the GIL
+        after = max_rss()
+        if after > self._before:
+            self.peak = max(self.peak, after)
+        return False
+
+def triangle_count(result):
+    """Output triangles of a stage result: a (verts, faces) pair, a Blender object or None"""
+    if bpy is not None and isinstance(result, bpy.types.Object):
+        import blendmesh
+        return len(blendmesh.read_triangles(result.data))
+    if isinstance(result, tuple) and len(result) >= 2:
+        return len(result[1])
+    return None
+
+def measure(records, name, label, vertices, fn, *args, repeat=1, setup=None, check=None):
+    """Run one stage, append its record and return its result
+
+    check(result) may raise to keep a wrong result out of the records.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            args = setup()
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            result = fn(*args)
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    if check is not None:
+        check(result)
+
+    record = {
+        'input': label,
+        'vertices': vertices,
+        'stage': name,
+        'seconds': round(best, 6),
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+        'triangles': triangle_count(result),
+    }
+    records.append(record)
+    print(f"  {name:<26} {record['seconds']:9.3f}s  {record['peak_rss_mb']:8.1f} MB  "
+          f"{record['triangles'] if record['triangles'] is not None else '-':>9}")
+    return result
+
+# --- Stages ---
+
+def run_numpy_stages(filepath, label, workdir, repeat):
+    """Stages of the bpy-free pipeline in relief.py"""
+    records = []
+    d = SETTINGS['coin_diameter']
+
+    verts, faces = measure(records, 'import', label, None, relief.load_mesh, filepath, repeat=repeat)
+    for record in records:
+        record['vertices'] = len(verts)
+
+    projected = measure(records, 'projection', label, len(verts), lambda: relief.project_relief(
+        meshbuffer.MeshBuffer(verts, faces, copy=True), d, SETTINGS['relief_depth'], SETTINGS['rotation']).arrays(),
+        repeat=repeat)
+
+    # Only a closed relief can be capped; an open one goes on to the combine uncut
+    def closed(result):
+        if slicer.open_edge_count(result[1]) > slicer.open_edge_count(projected[1]):
+            raise ValueError("The cut left open edges")
+    try:
+        cut = measure(records, 'bisect', label, len(verts), slicer.cut_back, *projected,
+                      SETTINGS['cut_height'], repeat=repeat, check=closed)
+    except ValueError as e:
+        print(f"  {'bisect':<26} skipped: {e}")
+        cut = projected
+    measure(records, 'heightmap', label, len(verts), heightmap.relief_solid,
+            relief.rotate(verts, SETTINGS['rotation']), faces, d, SETTINGS['relief_depth'],
+            SETTINGS['samples'], 0.0, -1.0, repeat=repeat)
+    base = measure(records, 'coin_base', label, len(verts), relief.coin_base, d, repeat=repeat)
+    coin = measure(records, 'combine', label, len(verts), relief.merge_meshes, cut, base, repeat=repeat)
+    measure(records, 'stitch', label, len(verts), lambda: heightmap.coin_solid(heightmap.relief_heights(
+        relief.rotate(verts, SETTINGS['rotation']), faces, d, SETTINGS['relief_depth'], SETTINGS['samples']), d),
+        repeat=repeat)
+    output = os.path.join(workdir, "bench.stl")
+    measure(records, 'stl_export', label, len(verts), lambda: (relief.write_stl(output, *coin), coin)[1],
+            repeat=repeat)
+    return records
+
+def run_blender_stages(filepath, label, workdir, repeat):
+    """bpy stages of the coin scripts, each timed on a fresh copy of its input"""
+    import blendmesh
+    import basrel3
+
+    records = []
+    d = SETTINGS['coin_diameter']
+
+    def import_input():
+        blendmesh.reset_scene()
+        if filepath.lower().endswith('.stl'):
+            return [blendmesh.new_mesh_object("Relief", *relief.load_mesh(filepath))]
+        return blendmesh.import_usd(filepath)
+
+    imported = measure(records, 'import_usd', label, None, import_input, repeat=repeat)
+    obj = measure(records, 'join', label, None, blendmesh.join_meshes, imported,
+                  repeat=repeat, setup=lambda: (import_input(),))
+    vertices = len(obj.data.vertices)
+    for record in records:
+        record['vertices'] = vertices
+
+    # Later stages start from the joined mesh, copied so repeats see the same input
+    verts = blendmesh.read_world_coords(obj.data, np.array(obj.matrix_world, dtype=np.float64))
+    faces = blendmesh.read_triangles(obj.data)
+
+    def fresh():
+        blendmesh.reset_scene()
+        return blendmesh.new_mesh_object("Relief", verts, faces)
+
+    def projected_buffer():
+        o = fresh()
+        return o, relief.project_relief(blendmesh.read_buffer(o), d, SETTINGS['relief_depth'], SETTINGS['rotation'])
+
+    def projected():
+        return blendmesh.write_buffer(*projected_buffer())
+
+    def with_base():
+        o = projected()
+        return basrel3.create_coin_base(d), o
+
+    measure(records, 'read_buffer', label, vertices, lambda o: blendmesh.read_buffer(o).arrays(),
+            None, repeat=repeat, setup=lambda: (fresh(),))
+    measure(records, 'projection', label, vertices,
+            lambda buf: relief.project_relief(buf, d, SETTINGS['relief_depth'], SETTINGS['rotation']).arrays(),
+            None, repeat=repeat, setup=lambda: (blendmesh.read_buffer(fresh()),))
+    measure(records, 'write_buffer', label, vertices, blendmesh.write_buffer,
+            None, None, repeat=repeat, setup=projected_buffer)
+    measure(records, 'create_coin_base', label, vertices, basrel3.create_coin_base, d,
+            repeat=repeat, setup=lambda: (projected(), d)[1:])
+    coin = measure(records, 'combine_relief_with_base', label, vertices, basrel3.combine_relief_with_base,
+                   None, None, repeat=repeat, setup=with_base)
+    output = os.path.join(workdir, "bench.stl")
+    measure(records, 'stl_export', label, vertices, lambda o: (blendmesh.export_mesh(o, output), o)[1],
+            coin, repeat=repeat)
+    return records
+
+# --- Baseline ---
+
+def compare(records, baseline, threshold):
+    """Print per-stage changes against a baseline; returns the regressed records"""
+    previous = {(r['input'], r['stage']): r for r in baseline.get('results', [])}
+    regressions = []
+    print("\nAgainst baseline:")
+    for record in records:
+        old = previous.get((record['input'], record['stage']))
+        if old is None or not old['seconds']:
+            continue
+        ratio = record['seconds'] / old['seconds']
+        slower = ratio > threshold and record['seconds'] - old['seconds'] > MIN_SECONDS
+        if slower:
+            regressions.append(record)
+        print(f"  {'SLOWER' if slower else '':<6} {record['input']:<16} {record['stage']:<26} "
+              f"{old['seconds']:9.3f}s -> {record['seconds']:9.3f}s  ({ratio:.2f}x)")
+    return regressions
+
+def main():
+    args = parse_args()
+    run_stages = run_blender_stages if bpy is not None else run_numpy_stages
+
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        inputs = [(path, os.path.basename(path)) for path in args['inputs']]
+        for size in args['sizes']:
+            path = os.path.join(workdir, f"synthetic_{size}.usda")
+            write_usda(path, *synthetic_mesh(size))
+            inputs.append((path, f"synthetic_{size}"))
+
+        for path, label in inputs:
+            print(f"\n{label}:")
+            try:
+                records.extend(run_stages(path, label, workdir, args['repeat']))
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+
+    results = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'blender': bpy.app.version_string if bpy is not None else None,
+        'machine': platform.machine(),
+        'settings': SETTINGS,
+        'results': records,
+    }
+    output = args['baseline'] if args['save_baseline'] and args['baseline'] else args['output']
+    with open(output, 'w') as fh:
+        json.dump(results, fh, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args['baseline'] and not args['save_baseline']:
+        with open(args['baseline']) as fh:
+            regressions = compare(records, json.load(fh), args['threshold'])
+        if regressions:
+            print(f"{len(regressions)} stages slower than {args['threshold']}x baseline")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Blender glue shared by the coin scripts.
+
+Moves mesh data between Blender objects and NumPy arrays in bulk and runs
+the common command line flow. The geometry itself lives in relief.py and
+heightmap.py, which do not need Blender.
+"""
+
+import bpy
+import os
+import sys
+import time
+from mathutils import Matrix
+import numpy as np
+
+import batch
+import cleanup
+import coinserver
+import heightmap
+import meshbuffer
+import meshcache
+import preview
+import profiling
+import relief
+import slicer
+import terrace
+import usda
+
+def clear_scene():
+    """Remove all objects from the scene"""
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
+
+def reset_scene():
+    """Clear the scene and free the data left behind by the last job"""
+    clear_scene()
+    bpy.data.orphans_purge(do_recursive=True)
+
+def import_usd(filepath):
+    """Import USD/USDA file, reading ASCII files with the streaming mesh reader"""
+    if filepath.lower().endswith('.usda'):
+        return [new_mesh_object("Relief", *usda.read_usda(filepath))]
+
+    with profiling.operator("usd_import"):
+        bpy.ops.wm.usd_import(filepath=filepath)
+    return bpy.context.selected_objects
+
+def join_meshes(imported_objects):
+    """Join the imported mesh objects into one active object named Relief"""
+    # Join all imported objects (if more than one)
+    bpy.ops.object.select_all(action='DESELECT')
+
+    # Filter to only mesh objects
+    mesh_objects = [obj for obj in imported_objects if obj.type == 'MESH']
+
+    if not mesh_objects:
+        raise ValueError("No mesh objects found in USD file")
+
+    for obj in mesh_objects:
+        obj.select_set(True)
+    bpy.context.view_layer.objects.active = mesh_objects[0]
+
+    # Ensure we're in object mode
+    if bpy.context.active_object and bpy.context.active_object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    if len(mesh_objects) > 1:
+        bpy.ops.object.join()
+
+    relief_obj = bpy.context.active_object
+    relief_obj.name = "Relief"
+    return relief_obj
+
+@profiling.traced
+def clean_object(obj):
+    """Weld seams, drop bad faces and keep the largest piece of the joined import"""
+    mesh = obj.data
+    verts = read_world_coords(mesh, np.array(obj.matrix_world, dtype=np.float64))
+    faces = read_triangles(mesh)
+    clean_verts, clean_faces = cleanup.clean(verts, faces)
+    print(f"Cleanup: {len(verts)} -> {len(clean_verts)} vertices, {len(faces)} -> {len(clean_faces)} triangles")
+    write_mesh(obj, clean_verts, clean_faces)
+    return obj
+
+def import_joined(args):
+    """Import and join the input, cleaned up if asked, going through the mesh cache when enabled"""
+    filepath = args['input']
+    if args['cache_dir']:
+        if filepath.lower().endswith('.usda'):
+            version = f"usda-{usda.VERSION}"
+        else:
+            version = f"blender-{bpy.app.version_string}"
+        if args['clean']:
+            version += f"/clean-{cleanup.VERSION}"
+        key = meshcache.file_key(filepath, version)
+        hit = meshcache.load(args['cache_dir'], key)
+        if hit is not None:
+            print("Using cached mesh")
+            relief_obj = new_mesh_object("Relief", *hit)
+            bpy.context.view_layer.objects.active = relief_obj
+            return relief_obj
+
+    imported_objects = import_usd(filepath)
+    if not imported_objects:
+        raise ValueError("No objects imported from USD file")
+    relief_obj = join_meshes(imported_objects)
+
+    if args['clean']:
+        clean_object(relief_obj)
+
+    if args['cache_dir']:
+        # Store in world space so a hit needs no object transform
+        mesh = relief_obj.data
+        verts = read_world_coords(mesh, np.array(relief_obj.matrix_world, dtype=np.float64))
+        try:
+            meshcache.store(args['cache_dir'], key, verts, read_triangles(mesh), args['cache_size'])
+        except OSError as e:
+            print(f"Warning: could not write mesh cache: {e}")
+    return relief_obj
+
+def read_world_coords(mesh, matrix):
+    """Read all vertex coordinates in one bulk call and return them in world space"""
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+def read_triangles(mesh):
+    """Read the triangulated faces of a mesh as an (N, 3) index array"""
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    return tris.reshape(-1, 3)
+
+def fill_mesh(mesh, verts, faces):
+    """Fill an empty mesh from vertex and triangle arrays in bulk"""
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.astype(np.float32).ravel())
+    mesh.loops.add(faces.size)
+    mesh.loops.foreach_set("vertex_index", faces.astype(np.int32).ravel())
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, faces.size, 3, dtype=np.int32))
+    mesh.update(calc_edges=True)
+
+def new_mesh_object(name, verts, faces):
+    """Create a selected mesh object from vertex and triangle arrays"""
+    mesh = bpy.data.meshes.new(name)
+    fill_mesh(mesh, verts, faces)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+    obj.select_set(True)
+    return obj
+
+def write_mesh(obj, verts, faces):
+    """Replace the object's mesh with triangle arrays given in world space"""
+    mesh = bpy.data.meshes.new(obj.data.name)
+    fill_mesh(mesh, verts, faces)
+
+    old_mesh = obj.data
+    obj.data = mesh
+    bpy.data.meshes.remove(old_mesh)
+    obj.parent = None
+    obj.matrix_world = Matrix.Identity(4)
+
+@profiling.traced
+def read_buffer(obj):
+    """Read the object's mesh into a MeshBuffer in world space, one bulk call per array"""
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    buf = meshbuffer.MeshBuffer(co, read_triangles(mesh))
+    return buf.transform(matrix[:3, :3], matrix[:3, 3])
+
+@profiling.traced
+def write_buffer(obj, buf):
+    """Sync a MeshBuffer back into the object; only the coordinates when the vertices are the same"""
+    mesh = obj.data
+    if len(mesh.vertices) != len(buf):
+        write_mesh(obj, *buf.arrays())
+        return obj
+
+    mesh.vertices.foreach_set("co", buf.verts.ravel())
+    mesh.update()
+    obj.parent = None
+    obj.matrix_world = Matrix.Identity(4)
+    return obj
+
+def rotated_buffer(obj, rotation):
+    """World space MeshBuffer of the object turned to the desired view"""
+    return read_buffer(obj).transform(relief.rotation_matrix(rotation))
+
+def create_relief_from_heightmap(obj, coin_diameter, relief_depth, rotation, samples, base_z=0.0, floor=0.0,
+                                 compression='linear', max_error=None):
+    """Create bas-relief by rasterizing the frontmost surface into a samples x samples heightmap"""
+    buf = rotated_buffer(obj, rotation)
+
+    # Rasterize and rebuild as a closed heightfield solid on the grid
+    verts, faces = heightmap.relief_solid(
+        buf.verts, buf.faces,
+        coin_diameter, relief_depth, samples,
+        base_z=base_z, floor=floor, compression=compression, max_error=max_error
+    )
+    write_mesh(obj, verts, faces)
+
+    return obj
+
+def create_coin_from_heightmap(obj, coin_diameter, relief_depth, rotation, samples, thickness=3.0, base_z=0.0,
+                               compression='linear', max_error=None, back=None):
+    """Build the whole coin as one watertight solid stitched from the heightmap, without a boolean
+
+    back is a MeshBuffer of the reverse already turned to its view (see
+    reverse_buffer), or None for a flat underside.
+    """
+    buf = rotated_buffer(obj, rotation)
+
+    heights = heightmap.relief_heights(buf.verts, buf.faces, coin_diameter, relief_depth, samples, compression)
+    back_heights = None
+    if back is not None:
+        back_heights = heightmap.relief_heights(back.verts, back.faces, coin_diameter, relief_depth, samples,
+                                                compression)
+    verts, faces = heightmap.coin_solid(heights, coin_diameter, thickness=thickness, base_z=base_z,
+                                        max_error=max_error, back=back_heights)
+    write_mesh(obj, verts, faces)
+    obj.name = "Coin"
+
+    return obj
+
+def relief_only(args):
+    """Raise ValueError for the options only relief.py implements"""
+    if args['combine'] in ('stream', 'merge'):
+        raise ValueError(f"--combine {args['combine']} is only supported by relief.py")
+    if args['layers']:
+        raise ValueError("--layers is only supported by relief.py")
+
+def single_face(args):
+    """Raise ValueError when args ask for a reverse, in the scripts that build one face only"""
+    if args['back']:
+        raise ValueError("--back is only supported by basrel3.py and relief.py")
+
+def uncut(args):
+    """Raise ValueError when args ask for a back cut, in the scripts that keep the whole relief"""
+    if args['cut'] or args['cut_height']:
+        raise ValueError("--cut and --cut-height are only supported by flat.py, proper.py and relief.py")
+
+def reverse_buffer(obj, args):
+    """World space MeshBuffer of the reverse turned to its view; read from obj when it is the input again
+
+    Call it before obj is rebuilt into the obverse.
+    """
+    back = relief.back_args(args)
+    if os.path.abspath(args['back']) == os.path.abspath(args['input']):
+        buf = read_buffer(obj)
+    else:
+        print("Importing reverse...")
+        back_obj = import_joined(back)
+        buf = read_buffer(back_obj)
+        bpy.data.objects.remove(back_obj)
+    return buf.transform(relief.rotation_matrix(relief.rotation_from_args(back)))
+
+def join_reverse(obj, reverse, thickness=3.0):
+    """Turn the reverse relief over onto the underside of the base and join it into obj, for a single union"""
+    verts, faces = relief.merge_meshes(read_buffer(obj).arrays(),
+                                       relief.turn_over(read_buffer(reverse).arrays(), thickness))
+    write_mesh(obj, verts, faces)
+    bpy.data.objects.remove(reverse)
+    return obj
+
+def cut_back(obj, buf, cut_height=0.0):
+    """Clip the relief in buf at cut_height above its lowest point and cap the cut flat at Z=0"""
+    verts, faces = slicer.cut_back(buf.verts, buf.faces, cut_height)
+    write_mesh(obj, verts, faces)
+
+    return obj
+
+def export_mesh(obj, filepath, layer_height=None):
+    """Write a single object as STL or 3MF straight from its mesh arrays, without the exporter operator
+
+    With a layer_height in mm the mesh is terraced to print layers first.
+    """
+    with profiling.span("stl_export", obj):
+        mesh = obj.data
+        verts = read_world_coords(mesh, np.array(obj.matrix_world, dtype=np.float32))
+        faces = read_triangles(mesh)
+        if layer_height:
+            verts, faces = terrace.terrace(verts, faces, layer_height)
+        relief.write_mesh(filepath, verts, faces)
+
+def run_jobs(jobs, build):
+    """Run a list of jobs in this Blender, importing each distinct input once per clean setting"""
+    failed = []
+    for (filepath, clean), group in batch.group_by_import(jobs).items():
+        reset_scene()
+        print(f"Importing {filepath}{' (clean)' if clean else ''}...")
+        try:
+            with profiling.span("import") as span:
+                imported = import_joined(group[0])
+                span.result(imported)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            failed.extend(group)
+            continue
+
+        # Keep the joined mesh as arrays and rebuild it for every variant
+        mesh = imported.data
+        verts = read_world_coords(mesh, np.array(imported.matrix_world, dtype=np.float64))
+        faces = read_triangles(mesh)
+
+        for job in group:
+            reset_scene()
+            if job['auto_orient']:
+                job = relief.auto_orient(job, verts, faces)
+            relief.print_settings(job)
+            relief_obj = new_mesh_object("Relief", verts, faces)
+            bpy.context.view_layer.objects.active = relief_obj
+            try:
+                relief_only(job)
+                with profiling.span("build", relief_obj) as span:
+                    final_obj = build(relief_obj, job)
+                    span.result(final_obj)
+                print(f"Exporting to {job['output']}...")
+                export_mesh(final_obj, job['output'], job['layer_height'])
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Error: {e}")
+                failed.append(job)
+
+    print(f"Batch: {len(jobs) - len(failed)} of {len(jobs)} coins written")
+    return failed
+
+def job_runner(build):
+    """Job function for coinserver: each job gets a fresh scene, the last import is kept as arrays"""
+    last = {}
+
+    def run_job(job):
+        relief_only(job)
+        start = time.perf_counter()
+        reset_scene()
+        key = (relief.input_stamp(job['input']), job['clean'])
+        if key not in last:
+            last.clear()
+            imported = import_joined(job)
+            last[key] = (read_world_coords(imported.data, np.array(imported.matrix_world, dtype=np.float64)),
+                         read_triangles(imported.data))
+            reset_scene()
+        if job['auto_orient']:
+            job = relief.auto_orient(job, *last[key])
+        relief_obj = new_mesh_object("Relief", *last[key])
+        bpy.context.view_layer.objects.active = relief_obj
+        ready = time.perf_counter()
+
+        final_obj = build(relief_obj, job)
+        built = time.perf_counter()
+        print(f"Exporting to {job['output']}...")
+        export_mesh(final_obj, job['output'], job['layer_height'])
+        return {'import': ready - start, 'build': built - ready, 'export': time.perf_counter() - built}
+
+    return run_job
+
+def main(build):
+    """Shared flow of the coin scripts; build(relief_obj, args) returns the object to export"""
+    args = relief.parse_args()
+    try:
+        relief_only(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if args['profile']:
+        profiling.start(args['profile'])
+
+    if args['serve']:
+        coinserver.serve(args['serve'], job_runner(build), args)
+        return
+
+    if args['jobs']:
+        try:
+            jobs = batch.read_manifest(args['jobs'], args)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sys.exit(1 if run_jobs(jobs, build) else 0)
+
+    if not args['input']:
+        relief.print_usage("blender --background --python coin_relief.py --")
+        sys.exit(1)
+
+    relief.print_settings(args)
+
+    # Clear default scene
+    clear_scene()
+
+    # Import USD file
+    print("Importing USD file...")
+    try:
+        with profiling.span("import") as span:
+            relief_obj = import_joined(args)
+            span.result(relief_obj)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args['auto_orient'] or args['preview']:
+        mesh = relief_obj.data
+        verts = read_world_coords(mesh, np.array(relief_obj.matrix_world, dtype=np.float64))
+        faces = read_triangles(mesh)
+        if args['auto_orient']:
+            args = relief.auto_orient(args, verts, faces)
+        if args['preview']:
+            print(f"Writing preview to {args['preview']}...")
+            preview.write_preview(args, verts, faces)
+            print("Done!")
+            return
+
+    try:
+        with profiling.span("build", relief_obj) as span:
+            final_obj = build(relief_obj, args)
+            span.result(final_obj)
+
+        # Export as STL
+        print(f"Exporting to {args['output']}...")
+        export_mesh(final_obj, args['output'], args['layer_height'])
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print("Done!")
@@ -0,0 +1,173 @@
+"""
+Mesh cleanup for photogrammetry captures.
+
+RealityKit captures split vertices along UV seams and carry near-duplicate
+vertices, loose fragments and doubled faces, all of which slow down or
+break the booleans. clean() welds vertices closer than a tolerance, drops
+collapsed and duplicate faces and keeps the largest connected piece.
+
+Welding hashes the vertices into cells of four times the tolerance on four
+grids shifted by a quarter cell along the diagonal. Two vertices closer
+than the tolerance straddle a cell border on at most one grid per axis, so
+they share a cell on at least one of the four. Within a cell each vertex is
+compared with the first one and its predecessor, which is exact for the
+one or two vertices a cell of a scan holds. Close pairs and connected
+pieces are merged with a vectorised union-find, so the whole pass is a few
+sorts and linear sweeps.
+
+Usage:
+    python3 cleanup.py model.usda
+"""
+
+import sys
+import numpy as np
+
+# Bump when the cleanup output changes, to invalidate cached imports
+VERSION = 1
+
+# Weld tolerance as a fraction of the bounding box diagonal
+WELD_TOLERANCE = 1e-5
+
+def components(count, a, b):
+    """Connected component of each of count nodes joined by edges a-b, as its smallest node index"""
+    parent = np.arange(count)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while len(a):
+        root_a = parent[a]
+        root_b = parent[b]
+        apart = root_a != root_b
+        a, b, root_a, root_b = a[apart], b[apart], root_a[apart], root_b[apart]
+        if not len(a):
+            break
+
+        # Hook every root under the smallest root it touches; a plain
+        # assignment would keep an arbitrary one and need many more rounds
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+
+        # Shortcut until every node points at its root again
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    return parent
+
+def _leaders(keys):
+    """For every element, the index of one element chosen per group of equal keys"""
+    order = np.argsort(keys)
+    ordered = keys[order]
+    first = np.empty(len(keys), dtype=bool)
+    first[:1] = True
+    first[1:] = ordered[1:] != ordered[:-1]
+    leader = np.empty(len(keys), dtype=np.int64)
+    leader[order] = order[first][np.cumsum(first) - 1]
+    return leader
+
+def _cell_pairs(keys):
+    """Pairs of elements with equal keys: each one with the first of its group and with its predecessor"""
+    order = np.argsort(keys)
+    ordered = keys[order]
+    same = ordered[1:] == ordered[:-1]
+    first = np.empty(len(keys), dtype=bool)
+    first[:1] = True
+    first[1:] = ~same
+    head = order[first][np.cumsum(first) - 1]
+    later = ~first
+    return (np.concatenate([order[later], order[1:][same]]),
+            np.concatenate([head[later], order[:-1][same]]))
+
+def _row_hash(values):
+    """64-bit hash of the bit patterns of each row"""
+    bits = np.ascontiguousarray(values)
+    bits = bits.view(np.uint32 if bits.dtype.itemsize == 4 else np.uint64).astype(np.uint64)
+    h = np.zeros(len(bits), dtype=np.uint64)
+    for k in range(bits.shape[1]):
+        h = (h ^ bits[:, k]) * np.uint64(0x100000001B3)
+    return h
+
+def weld(verts, faces, tolerance):
+    """Merge vertices closer than tolerance into their mean; returns new verts and remapped faces"""
+    verts = np.asarray(verts).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if len(verts) == 0:
+        return verts.astype(np.float64), faces
+
+    # Exact duplicates first; these are most of a capture's seam vertices.
+    # Rows that only share a hash with their leader stay on their own.
+    leader = _leaders(_row_hash(verts))
+    alone = np.any(verts[leader] != verts, axis=1)
+    leader[alone] = np.nonzero(alone)[0]
+    is_leader = leader == np.arange(len(verts))
+    inverse = (np.cumsum(is_leader) - 1)[leader]
+    unique = verts[is_leader].astype(np.float64)
+
+    a = []
+    b = []
+    if tolerance > 0:
+        grid = (unique - unique.min(axis=0)) / (4 * tolerance)
+        for shift in range(4):
+            key = np.floor(grid + shift / 4).astype(np.int64)
+            dims = key.max(axis=0) + 1
+            i, j = _cell_pairs((key[:, 0] * dims[1] + key[:, 1]) * dims[2] + key[:, 2])
+            delta = unique[i] - unique[j]
+            close = np.einsum('ij,ij->i', delta, delta) < tolerance ** 2
+            a.append(i[close])
+            b.append(j[close])
+    label = components(len(unique), np.concatenate(a) if a else [], np.concatenate(b) if b else [])
+
+    roots = label == np.arange(len(unique))
+    cluster = (np.cumsum(roots) - 1)[label]
+    count = np.bincount(cluster)
+    points = np.stack([np.bincount(cluster, unique[:, k], len(count)) for k in range(3)], axis=1) / count[:, None]
+    return points, cluster[inverse][faces]
+
+def drop_bad_faces(faces):
+    """Faces without a repeated corner, and only one of faces using the same three vertices"""
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    faces = faces[keep]
+    corners = np.sort(faces, axis=1)
+    leader = _leaders(_row_hash(corners))
+    alone = np.any(corners[leader] != corners, axis=1)
+    return faces[(leader == np.arange(len(faces))) | alone]
+
+def largest_component(verts, faces):
+    """Faces of the connected piece with the most faces, with unused vertices dropped"""
+    if len(faces) == 0:
+        return verts[:0], faces
+    label = components(len(verts), faces[:, [0, 1]].ravel(), faces[:, [1, 2]].ravel())
+    face_label = label[faces[:, 0]]
+    faces = faces[face_label == np.argmax(np.bincount(face_label))]
+
+    used = np.zeros(len(verts), dtype=bool)
+    used[faces] = True
+    remap = np.cumsum(used) - 1
+    return verts[used], remap[faces]
+
+def clean(verts, faces, tolerance=None):
+    """Weld, drop bad faces and keep the largest piece; tolerance defaults to WELD_TOLERANCE of the diagonal"""
+    verts = np.asarray(verts).reshape(-1, 3)
+    if tolerance is None:
+        diagonal = np.linalg.norm(verts.max(axis=0) - verts.min(axis=0)) if len(verts) else 0.0
+        tolerance = WELD_TOLERANCE * diagonal
+    verts, faces = weld(verts, faces, tolerance)
+    verts, faces = largest_component(verts, drop_bad_faces(faces))
+    return verts.astype(np.float32), faces.astype(np.int32)
+
+def main():
+    import time
+    import relief
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 cleanup.py model.usda")
+        sys.exit(1)
+
+    verts, faces = relief.load_mesh(sys.argv[1])
+    start = time.perf_counter()
+    out_verts, out_faces = clean(verts, faces)
+    print(f"{len(verts)} -> {len(out_verts)} vertices, {len(faces)} -> {len(out_faces)} triangles "
+          f"in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
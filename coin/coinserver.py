@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Warm coin worker reachable over a Unix socket.
+
+A coin script started with --serve <socket> (relief.py, or a Blender script
+in background Blender) stays up and runs one job per request, so clients
+pay only for the geometry work instead of interpreter and Blender start-up.
+
+The protocol is one JSON object per line each way. A request holds fields
+of the parse_args dict ({"input": ..., "output": ..., "coin_diameter": ...}),
+read with the same types as on the command line; fields left out take their
+value from the server's command line. The reply is {"ok": true, "output":
+path, "timings": {stage: seconds}} or {"ok": false, "error": message}. Any
+number of clients can connect; their jobs run one at a time, in arrival
+order, on the server's main thread.
+
+Usage:
+    blender --background --python basrel3.py -- --serve /tmp/coin.sock [options]
+    python3 coinserver.py --socket /tmp/coin.sock --input model.usda --output coin.stl [options]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import socket
+import threading
+
+import batch
+import relief
+
+# parse_args key -> type, as parse_args and batch manifests read them
+TYPES = dict(
+    {key: convert for key, convert in batch.FIELDS.values()},
+    cache_dir=str,
+    cache_size=float,
+    profile=str,
+    preview=str,
+    preview_grid=float,
+    layers=str,
+)
+
+def read_request(line, defaults):
+    """Job dict for one request line, based on the server's defaults"""
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    unknown = sorted(set(request) - set(defaults))
+    if unknown:
+        raise ValueError(f"Unknown field '{unknown[0]}'")
+
+    job = dict(defaults)
+    for key, value in request.items():
+        if value is None or key not in TYPES:
+            job[key] = value
+            continue
+        try:
+            job[key] = TYPES[key](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Bad value for {key}: {value!r}")
+    job['jobs'] = None
+    job['serve'] = None
+    if not job['input'] and not job['layers']:
+        raise ValueError("input or layers is required")
+    return job
+
+def _client(conn, jobs, defaults):
+    """Read request lines from one connection, queue them and send back the replies"""
+    with conn, conn.makefile('rb') as reader:
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                job = read_request(line, defaults)
+            except ValueError as e:
+                reply = {'ok': False, 'error': str(e)}
+            else:
+                done = queue.Queue(maxsize=1)
+                jobs.put((job, time.perf_counter(), done))
+                reply = done.get()
+            try:
+                conn.sendall(json.dumps(reply).encode() + b"\n")
+            except OSError:
+                return
+
+def _listen(server, jobs, defaults):
+    """Accept connections and give each its own reader thread"""
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=_client, args=(conn, jobs, defaults), daemon=True).start()
+
+def serve(path, run_job, defaults):
+    """Serve jobs on a Unix socket at path until interrupted or terminated
+
+    run_job(job) runs one job on this thread and returns a dict of stage
+    timings in seconds; an exception fails the job without stopping the
+    server.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+
+    # Leave through the finally below on a plain kill too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    jobs = queue.Queue()
+    threading.Thread(target=_listen, args=(server, jobs, defaults), daemon=True).start()
+    print(f"Serving coin jobs on {path}")
+
+    try:
+        while True:
+            job, queued, done = jobs.get()
+            start = time.perf_counter()
+            try:
+                relief.print_settings(job)
+                timings = run_job(job)
+            except Exception as e:
+                print(f"Error: {e}")
+                done.put({'ok': False, 'error': str(e)})
+                continue
+            timings['queued'] = start - queued
+            timings['total'] = time.perf_counter() - queued
+            done.put({'ok': True, 'output': job['output'], 'timings': timings})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+
+def submit(path, job):
+    """Send one job to a server and wait for its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path)
+        conn.sendall(json.dumps(job).encode() + b"\n")
+        with conn.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise OSError("Server closed the connection")
+    return json.loads(line)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if '--socket' not in argv or argv.index('--socket') + 1 >= len(argv):
+        print("Error: --socket <path> is required")
+        print("\nUsage:")
+        print("  python3 coinserver.py --socket /tmp/coin.sock --input model.usda [options]")
+        print("  python3 coinserver.py --socket /tmp/coin.sock --layers layout.json [options]")
+        sys.exit(1)
+    i = argv.index('--socket')
+    path = argv[i + 1]
+    args = relief.parse_args(argv[:i] + argv[i + 2:])
+    if not args['input'] and not args['layers']:
+        print("Error: --input <file.usda> or --layers <file.json> is required")
+        sys.exit(1)
+
+    # Only send what was given; the server fills in its own defaults
+    defaults = relief.parse_args([])
+    job = {key: value for key, value in args.items() if value != defaults[key]}
+    for key in ('input', 'output', 'layers'):
+        if args[key]:
+            job[key] = os.path.abspath(args[key])
+
+    try:
+        reply = submit(path, job)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not reply['ok']:
+        print(f"Error: {reply['error']}")
+        sys.exit(1)
+    stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in reply['timings'].items())
+    print(f"Wrote {reply['output']} ({stages})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Heightfield compositing of several elements on one coin face.
+
+A layout lists the elements of the face, each drawn into its own heightmap
+on the coin grid and merged into the face one after another. Only the
+finished face is meshed, once, so the cost grows with the grid and the
+meshes rasterized rather than with the booleans between elements:
+
+    [{"input": "head.usda", "size": 32, "depth": 2.0, "rotate_x": 90},
+     {"input": "mark.usda", "x": 11, "y": -12, "size": 6, "depth": 0.5, "op": "add"},
+     {"rim": 1.5, "depth": 1.0}]
+
+A mesh element is scaled so its larger XY extent is `size` mm (85% of the
+coin by default), centred on x, y in mm from the middle of the coin and
+compressed to `depth` mm. A rim element is a flat band `rim` mm wide along
+the edge. Each layer then combines with the face below it by `op`:
+
+    max       the higher of the two (default)
+    add       raised on top of the face
+    subtract  cut into the face, down into the base where the face is empty
+    mask      keep only the part of the face the element covers
+
+Other fields (rotate_x/y/z, compress, clean) work as in a batch manifest
+and, like depth, default to the command line.
+"""
+
+import os
+import json
+import numpy as np
+
+import batch
+import heightmap
+
+# Layout field -> (layer key, type)
+FIELDS = {
+    'input': ('input', str),
+    'rim': ('rim', float),
+    'x': ('x', float),
+    'y': ('y', float),
+    'size': ('size', float),
+    'depth': ('relief_depth', float),
+    'op': ('op', str),
+    'rotate_x': ('rotation_x', float),
+    'rotate_y': ('rotation_y', float),
+    'rotate_z': ('rotation_z', float),
+    'compress': ('compress', str),
+    'clean': ('clean', batch.flag),
+}
+
+OPS = ('max', 'add', 'subtract', 'mask')
+
+def read_layout(filepath, defaults):
+    """Read a layout file into a list of layer dicts based on the argument dict defaults"""
+    with open(filepath) as fh:
+        rows = json.load(fh)
+    if isinstance(rows, dict):
+        rows = rows.get('layers', [])
+
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    layers = []
+    for n, row in enumerate(rows, 1):
+        layer = dict(defaults, input=None, rim=None, x=0.0, y=0.0, size=None, op='max')
+        for field, value in row.items():
+            if field not in FIELDS:
+                raise ValueError(f"Layer {n}: unknown field '{field}'")
+            if value is None or value == '':
+                continue
+            key, convert = FIELDS[field]
+            layer[key] = convert(value)
+
+        if (layer['input'] is None) == (layer['rim'] is None):
+            raise ValueError(f"Layer {n}: give either input or rim")
+        if layer['op'] not in OPS:
+            raise ValueError(f"Layer {n}: unknown op '{layer['op']}'")
+        if layer['input'] is not None:
+            layer['input'] = os.path.join(base_dir, os.path.expanduser(layer['input']))
+        layers.append(layer)
+
+    if not layers:
+        raise ValueError(f"No layers in {filepath}")
+    return layers
+
+def rim_heights(width, depth, coin_diameter, samples):
+    """Heightmap of a flat band `width` mm wide inside the coin edge, NaN elsewhere"""
+    centers = heightmap.grid_centers(coin_diameter, samples)
+    radius = np.sqrt(centers[None, :] ** 2 + centers[:, None] ** 2)
+    heights = np.full((samples, samples), np.nan)
+    heights[radius >= coin_diameter / 2 - width] = depth
+    return heights
+
+def layer_heights(layer, mesh, coin_diameter, samples):
+    """Heightmap of one layer on the coin grid; mesh is its (verts, faces), unused for a rim"""
+    if layer['rim'] is not None:
+        return rim_heights(layer['rim'], layer['relief_depth'], coin_diameter, samples)
+
+    import relief
+    verts, faces = mesh
+    fill = layer['size'] / coin_diameter if layer['size'] else 0.85
+    return heightmap.relief_heights(
+        relief.rotate(verts, relief.rotation_from_args(layer)), faces,
+        coin_diameter, layer['relief_depth'], samples, layer['compress'],
+        fill=fill, center=(layer['x'], layer['y'])
+    )
+
+def combine(face, heights, op):
+    """Merge a layer heightmap into the face heightmap in place; NaN marks empty cells in both"""
+    hit = np.isfinite(heights)
+    if op == 'max':
+        np.fmax(face, heights, out=face)
+    elif op == 'add':
+        face[hit] = np.nan_to_num(face[hit], nan=0.0) + heights[hit]
+    elif op == 'subtract':
+        face[hit] = np.nan_to_num(face[hit], nan=0.0) - heights[hit]
+    elif op == 'mask':
+        face[~hit] = np.nan
+    else:
+        raise ValueError(f"Unknown layer op '{op}'")
+
+def compose(layers, coin_diameter, samples, load):
+    """Face heightmap of the layers in mm, NaN where empty
+
+    load(layer) returns the (verts, faces) of a mesh layer; layers sharing
+    an input are loaded once.
+    """
+    face = np.full((samples, samples), np.nan)
+    meshes = {}
+    for layer in layers:
+        mesh = None
+        if layer['input'] is not None:
+            key = (layer['input'], layer['clean'])
+            if key not in meshes:
+                meshes[key] = load(layer)
+            mesh = meshes[key]
+        combine(face, layer_heights(layer, mesh, coin_diameter, samples), layer['op'])
+    return face
@@ -0,0 +1,279 @@
+"""
+Error-bounded mesh decimation for coin reliefs.
+
+Vertices are clustered on a grid and every cluster is replaced by the point
+minimising its quadric error (the summed squared distance to the planes of
+its faces). Clusters whose point strays further than the tolerance from any
+of those planes are split again on a grid of half the spacing, so flat
+areas collapse into large cells while edges and fine detail keep small
+ones. Everything runs as whole-array NumPy passes, one per level.
+
+Only vertices whose normals point the same way share a cluster, so the two
+sides of a thin part are not pulled together. A clustering that still
+leaves an edge used other than once each way, or turns a face over, is
+redone with the clusters involved split further, as far as single
+vertices, so closed manifold meshes stay closed and manifold.
+
+Usage:
+    python3 decimate.py model.stl 0.05
+"""
+
+import sys
+import numpy as np
+
+# Cell size of the first level, in multiples of the tolerance
+COARSEST = 16
+
+# A symmetric 4x4 quadric is stored as its 10 upper-triangle entries
+UPPER = np.triu_indices(4)
+
+def face_quadrics(verts, faces):
+    """Area-weighted plane quadrics of the faces as (F, 10), and the planes as unit normal plus offset"""
+    tri = verts[faces]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.linalg.norm(normal, axis=1)
+    unit = normal / np.where(length > 0, length, 1)[:, None]
+    plane = np.concatenate([unit, -np.einsum('ij,ij->i', unit, tri[:, 0])[:, None]], axis=1)
+    quadrics = (length / 2)[:, None] * plane[:, UPPER[0]] * plane[:, UPPER[1]]
+    return quadrics, plane
+
+def _sum_rows(index, values, count):
+    """Row sums of values grouped by index, one bincount per column"""
+    return np.stack([np.bincount(index, values[:, k], count) for k in range(values.shape[1])], axis=1)
+
+def _optimal_points(upper, mean):
+    """Quadric minimisers, regularised towards the cluster means where q is flat"""
+    q = np.empty((len(upper), 4, 4))
+    q[:, UPPER[0], UPPER[1]] = upper
+    q[:, UPPER[1], UPPER[0]] = upper
+    a = q[:, :3, :3]
+    b = q[:, :3, 3]
+    reg = 1e-3 * np.trace(a, axis1=1, axis2=2) / 3 + 1e-12
+    a = a + reg[:, None, None] * np.eye(3)
+    return np.linalg.solve(a, (reg[:, None] * mean - b)[..., None])[..., 0]
+
+def _cluster(verts, vert_q, plane, inc_vert, inc_face, tolerance, depth, levels, facing, subset, origin):
+    """Cluster the subset of vertices; vertex v may finish no earlier than level depth[v]
+
+    Vertices with a depth past the last level stay where they are, on
+    their own. Returns the cluster points, the cluster of every subset
+    vertex and the level each cluster finished at. origin is the corner of
+    the grid, the same on every call so the cells nest.
+    """
+    alone = depth[subset] >= levels
+    cluster = np.full(len(subset), -1, dtype=np.int64)
+    cluster[alone] = np.arange(alone.sum())
+    points = [verts[subset[alone]]]
+    finished_at = [np.full(int(alone.sum()), levels)]
+    count = int(alone.sum())
+    active = ~alone
+    cell = tolerance * COARSEST
+
+    # Incidences of the subset only; owner maps vertices to this level's clusters
+    member = np.zeros(len(verts), dtype=bool)
+    member[subset] = True
+    rows = member[inc_vert]
+    inc_vert = inc_vert[rows]
+    inc_face = inc_face[rows]
+    owner = np.full(len(verts), -1, dtype=np.int64)
+
+    for level in range(levels):
+        if not active.any():
+            break
+        last = level == levels - 1
+        pos = np.nonzero(active)[0]
+        idx = subset[pos]
+        cells = np.floor((verts[idx] - origin) / cell).astype(np.int64)
+        dims = cells.max(axis=0) + 1
+        flat, local = np.unique(((cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]) * 6 + facing[idx],
+                                return_inverse=True)
+        flat //= 6
+        keys = np.stack([flat // (dims[1] * dims[2]), flat // dims[2] % dims[1], flat % dims[2]], axis=1)
+        local = local.ravel()
+
+        q = _sum_rows(local, vert_q[idx], len(keys))
+        n = np.bincount(local, minlength=len(keys))
+        mean = _sum_rows(local, verts[idx], len(keys)) / n[:, None]
+        p = _optimal_points(q, mean)
+
+        # Keep every point inside its cell
+        lo = origin + keys * cell
+        p = np.clip(p, lo, lo + cell)
+
+        # Worst distance from a cluster point to the planes of its faces
+        owner[:] = -1
+        owner[idx] = local
+        use = owner[inc_vert] >= 0
+        c = owner[inc_vert[use]]
+        pl = plane[inc_face[use]]
+        dist = np.abs(np.einsum('ij,ij->i', pl[:, :3], p[c]) + pl[:, 3])
+        error = np.zeros(len(keys))
+        np.maximum.at(error, c, dist)
+
+        # Clusters holding a vertex sent further down wait for a finer level
+        deepest = np.zeros(len(keys), dtype=np.int64)
+        np.maximum.at(deepest, local, depth[idx])
+        done = ((error <= tolerance) | last) & (deepest <= level)
+        new_id = np.full(len(keys), -1, dtype=np.int64)
+        new_id[done] = count + np.arange(done.sum())
+        count += int(done.sum())
+        points.append(p[done])
+        finished_at.append(np.full(int(done.sum()), level))
+
+        finished = done[local]
+        cluster[pos[finished]] = new_id[local[finished]]
+        active[pos[finished]] = False
+        cell /= 2
+
+    return np.concatenate(points), cluster, np.concatenate(finished_at)
+
+def _edge_uses(faces, count):
+    """Undirected edges of faces as (low * count + high) keys, with their use count and forward uses"""
+    start = faces.ravel()
+    end = faces[:, [1, 2, 0]].ravel()
+    low = np.minimum(start, end)
+    high = np.maximum(start, end)
+
+    # Sorting with the direction as the lowest bit puts each edge's uses side by side
+    tagged = np.sort((low * count + high) * 2 + (start < end))
+    edge = tagged >> 1
+    first = np.flatnonzero(np.r_[True, edge[1:] != edge[:-1]])
+    uses = np.diff(np.r_[first, len(edge)])
+    forward = np.add.reduceat(tagged & 1, first) if len(first) else first
+    return edge[first], uses, forward
+
+def _collapse(cluster, faces):
+    """Faces of the clustered mesh, and for each the original face; duplicates in the same winding are dropped"""
+    new_faces = cluster[faces]
+    keep = np.nonzero((new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2])
+                      & (new_faces[:, 2] != new_faces[:, 0]))[0]
+    new_faces = new_faces[keep]
+
+    # Same triangle, same winding: start each at its smallest corner
+    turn = np.argmin(new_faces, axis=1)
+    rows = np.arange(len(new_faces))[:, None]
+    ordered = new_faces[rows, (turn[:, None] + np.arange(3)) % 3]
+    order = np.lexsort((ordered[:, 2], ordered[:, 1], ordered[:, 0]))
+    ordered = ordered[order]
+    first = np.sort(order[np.r_[True, np.any(ordered[1:] != ordered[:-1], axis=1)]])
+    return new_faces[first], keep[first]
+
+def _bad_clusters(points, new_faces, source, normals, near):
+    """Clusters on faces with an edge not used once each way, or turned over by the collapse
+
+    new_faces must hold every face with a corner in a near cluster; only
+    edges between two near clusters are judged, since others may have uses
+    outside new_faces.
+    """
+    count = len(points)
+    edge, uses, forward = _edge_uses(new_faces, count)
+    wrong = edge[((uses != 2) | (forward != 1)) & near[edge // count] & near[edge % count]]
+    start = new_faces.ravel()
+    end = new_faces[:, [1, 2, 0]].ravel()
+    key = np.minimum(start, end) * count + np.maximum(start, end)
+    at = np.minimum(np.searchsorted(wrong, key), max(len(wrong) - 1, 0))
+    on_wrong = (wrong[at] == key).reshape(-1, 3).any(axis=1) if len(wrong) else np.zeros(len(new_faces), dtype=bool)
+
+    # Faces that had no area to begin with have no side to turn over
+    tri = points[new_faces]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    flipped = (np.einsum('ij,ij->i', normal, normals[source]) <= 0) & normals[source].any(axis=1)
+
+    bad = np.zeros(count, dtype=bool)
+    bad[new_faces[on_wrong | flipped].ravel()] = True
+    return bad
+
+def simplify(verts, faces, tolerance):
+    """Decimate a triangle mesh so no cluster point is further than tolerance from its faces
+
+    Returns new (verts, faces) arrays; faces collapsed to lines or points and
+    faces repeated in the same winding are dropped. Vertices on open or
+    non-manifold edges of the input are kept as they are.
+    """
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if tolerance <= 0 or len(faces) == 0:
+        return verts, faces
+
+    quadrics, plane = face_quadrics(verts, faces)
+    vert_q = sum(_sum_rows(faces[:, k], quadrics, len(verts)) for k in range(3))
+
+    # Faces touching each vertex, as a flat (vertex, face) incidence list
+    inc_vert = faces.ravel()
+    inc_face = np.repeat(np.arange(len(faces)), 3)
+
+    # Facing: the dominant axis and sign of the area-weighted vertex normal
+    tri = verts[faces]
+    face_normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    vert_normal = _sum_rows(inc_vert, face_normal[inc_face], len(verts))
+    axis = np.argmax(np.abs(vert_normal), axis=1)
+    facing = axis * 2 + (vert_normal[np.arange(len(verts)), axis] < 0)
+
+    # Levels until the cells are half the tolerance
+    levels = 1
+    while tolerance * COARSEST / 2 ** (levels - 1) > tolerance / 2:
+        levels += 1
+
+    depth = np.zeros(len(verts), dtype=np.int64)
+    edge, uses, forward = _edge_uses(faces, len(verts))
+    border = edge[(uses != 2) | (forward != 1)]
+    depth[border // len(verts)] = levels
+    depth[border % len(verts)] = levels
+
+    # Cells nest from level to level, so the vertices of a cluster sent
+    # further down only ever regroup among themselves: each round reclusters
+    # just those and keeps every other cluster
+    points = np.empty((0, 3))
+    cluster = np.full(len(verts), -1, dtype=np.int64)
+    finished_at = np.empty(0, dtype=np.int64)
+    subset = np.arange(len(verts))
+    origin = verts.min(axis=0)
+    while True:
+        new_points, local, new_finished = _cluster(verts, vert_q, plane, inc_vert, inc_face, tolerance,
+                                                   depth, levels, facing, subset, origin)
+        cluster[subset] = len(points) + local
+        points = np.concatenate([points, new_points])
+        finished_at = np.concatenate([finished_at, new_finished])
+
+        # Only edges of the clusters around the regrouped vertices can have
+        # changed; the faces touching those clusters hold all their uses
+        member = np.zeros(len(verts), dtype=bool)
+        member[subset] = True
+        touched = member[faces]
+        near = np.zeros(len(points), dtype=bool)
+        near[cluster[faces[touched[:, 0] | touched[:, 1] | touched[:, 2]]]] = True
+        corner = near[cluster[faces]]
+        around = np.nonzero(corner[:, 0] | corner[:, 1] | corner[:, 2])[0]
+        new_faces, source = _collapse(cluster, faces[around])
+
+        # Single vertices are where they started, so only the input can be at fault there
+        bad = _bad_clusters(points, new_faces, around[source], plane[:, :3], near) & (finished_at < levels)
+        if not bad.any():
+            break
+
+        # Send the vertices of those clusters one level further down
+        subset = np.nonzero(bad[cluster])[0]
+        depth[subset] = finished_at[cluster[subset]] + 1
+
+    # Renumber without the points no face uses any more
+    new_faces, source = _collapse(cluster, faces)
+    used = np.zeros(len(points), dtype=bool)
+    used[new_faces] = True
+    remap = np.cumsum(used) - 1
+    return points[used], remap[new_faces]
+
+def main():
+    import time
+    import relief
+
+    if len(sys.argv) < 3:
+        print("Usage: python3 decimate.py model.stl <tolerance mm>")
+        sys.exit(1)
+
+    verts, faces = relief.load_mesh(sys.argv[1])
+    start = time.perf_counter()
+    out_verts, out_faces = simplify(verts, faces, float(sys.argv[2]))
+    print(f"{len(faces)} -> {len(out_faces)} triangles in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Run a batch manifest of coins across several worker processes.
+
+Usage:
+    python3 fanout.py --jobs manifest.json [--workers N] [options]
+    python3 fanout.py --jobs manifest.json --blender blender --script basrel3.py
+
+Each job runs through the normal main() entry point of relief.py, or of a
+Blender coin script when --blender is given, in its own process. Jobs are
+started most expensive first (input vertices x samples), killed after
+--timeout seconds, retried up to --retries times, and summarised at the end.
+Any other option is passed to every job as the default for fields the
+manifest leaves out.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+import batch
+import relief
+
+RELIEF_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "relief.py")
+
+# Rough size of one vertex in an Object Capture .usda (points, normals, uvs, indices)
+USDA_BYTES_PER_VERTEX = 180
+
+def parse_args(argv=None):
+    """Split driver options from the coin options passed on to every job"""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    options = {
+        'workers': os.cpu_count() or 1,
+        'timeout': None,         # seconds per job
+        'retries': 1,
+        'blender': None,         # Blender executable, None for bpy-free workers
+        'script': None,          # coin script run by Blender workers
+    }
+
+    rest = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--workers' and i + 1 < len(argv):
+            options['workers'] = int(argv[i + 1])
+            i += 2
+        elif argv[i] == '--timeout' and i + 1 < len(argv):
+            options['timeout'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--retries' and i + 1 < len(argv):
+            options['retries'] = int(argv[i + 1])
+            i += 2
+        elif argv[i] == '--blender' and i + 1 < len(argv):
+            options['blender'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--script' and i + 1 < len(argv):
+            options['script'] = argv[i + 1]
+            i += 2
+        else:
+            rest.append(argv[i])
+            i += 1
+
+    return options, relief.parse_args(rest)
+
+def job_argv(job):
+    """Command line arguments that make parse_args return this job"""
+    argv = []
+    for field, (key, convert) in batch.FIELDS.items():
+        if convert is batch.flag:
+            argv += ['--' + field.replace('_', '-')] if job.get(key) else []
+        elif job.get(key) is not None:
+            argv += ['--' + field.replace('_', '-'), str(job[key])]
+    if job['cache_dir']:
+        argv += ['--cache-dir', job['cache_dir'], '--cache-size', str(job['cache_size'])]
+    else:
+        argv += ['--no-cache']
+    return argv
+
+def job_command(job, options):
+    """Process command line running one job"""
+    if options['blender']:
+        return [options['blender'], '--background', '--python', options['script'], '--'] + job_argv(job)
+    return [sys.executable, RELIEF_SCRIPT] + job_argv(job)
+
+def estimate_vertices(filepath):
+    """Cheap input vertex count estimate from the file header or size"""
+    try:
+        size = os.path.getsize(filepath)
+        if filepath.lower().endswith('.stl'):
+            with open(filepath, 'rb') as fh:
+                fh.seek(80)
+                triangles = int.from_bytes(fh.read(4), 'little')
+            if size == 84 + 50 * triangles:
+                return max(triangles // 2, 1)
+        return max(size // USDA_BYTES_PER_VERTEX, 1)
+    except OSError:
+        return 1
+
+def run_parallel(jobs, options):
+    """Run jobs on options['workers'] processes; returns one result dict per job"""
+    vertices = {path: estimate_vertices(path) for path in batch.group_by_input(jobs)}
+    tasks = [{
+        'job': job,
+        'cost': vertices[job['input']] * job['samples'],
+        'attempts': 0,
+        'status': 'pending',
+        'seconds': 0.0,
+        'log': None,
+    } for job in jobs]
+
+    # Longest jobs first keeps the workers evenly loaded at the end
+    queue = sorted(tasks, key=lambda task: task['cost'], reverse=True)
+    running = []
+
+    while queue or running:
+        while queue and len(running) < options['workers']:
+            task = queue.pop(0)
+            task['attempts'] += 1
+            log = tempfile.TemporaryFile()
+            proc = subprocess.Popen(job_command(task['job'], options), stdout=log, stderr=subprocess.STDOUT)
+            running.append((task, proc, time.monotonic(), log))
+
+        time.sleep(0.05)
+
+        still_running = []
+        for task, proc, start, log in running:
+            elapsed = time.monotonic() - start
+            if proc.poll() is None:
+                if options['timeout'] is None or elapsed < options['timeout']:
+                    still_running.append((task, proc, start, log))
+                    continue
+                proc.kill()
+                proc.wait()
+                task['status'] = 'timeout'
+            else:
+                task['status'] = 'ok' if proc.returncode == 0 else f"exit {proc.returncode}"
+
+            task['seconds'] += elapsed
+            log.seek(0)
+            task['log'] = log.read().decode(errors='replace')
+            log.close()
+
+            if task['status'] != 'ok' and task['attempts'] <= options['retries']:
+                print(f"Retrying {task['job']['output']} ({task['status']})")
+                queue.insert(0, task)
+        running = still_running
+
+    return tasks
+
+def print_summary(tasks, wall_time):
+    """One line per job plus totals"""
+    print("\nSummary:")
+    for task in tasks:
+        print(f"  {task['status']:<8} {task['seconds']:8.2f}s  x{task['attempts']}  {task['job']['output']}")
+
+    failed = [task for task in tasks if task['status'] != 'ok']
+    busy = sum(task['seconds'] for task in tasks)
+    print(f"{len(tasks) - len(failed)} of {len(tasks)} coins written in {wall_time:.2f}s "
+          f"({busy:.2f}s of work, {busy / wall_time if wall_time > 0 else 0:.1f}x parallel)")
+
+    for task in failed:
+        print(f"\n--- {task['job']['output']} ({task['status']}) ---")
+        print(task['log'].strip()[-2000:])
+
+def main(argv=None):
+    options, defaults = parse_args(argv)
+
+    if not defaults['jobs']:
+        print("Error: --jobs <manifest> is required")
+        print("\nUsage:")
+        print("  python3 fanout.py --jobs manifest.json [options]")
+        print("\nOptions:")
+        print("  --workers <int>        Worker processes (default: number of cores)")
+        print("  --timeout <seconds>    Kill jobs running longer than this (default: none)")
+        print("  --retries <int>        Retries per failed job (default: 1)")
+        print("  --blender <exe>        Run jobs in background Blender instead of relief.py")
+        print("  --script <file.py>     Coin script for Blender workers (e.g. basrel3.py)")
+        sys.exit(1)
+    if options['blender'] and not options['script']:
+        print("Error: --blender needs --script <coin script>")
+        sys.exit(1)
+
+    try:
+        jobs = batch.read_manifest(defaults['jobs'], defaults)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Running {len(jobs)} coins on {options['workers']} workers...")
+    start = time.monotonic()
+    tasks = run_parallel(jobs, options)
+    print_summary(tasks, time.monotonic() - start)
+
+    sys.exit(0 if all(task['status'] == 'ok' for task in tasks) else 1)
+
+if __name__ == "__main__":
+    main()
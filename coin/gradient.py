@@ -0,0 +1,169 @@
+"""
+Gradient-domain compression of relief heightmaps.
+
+The linear squash maps the whole depth range onto relief_depth, so a deep
+capture leaves its fine detail a few microns tall. Here the slopes of the
+depth buffer are compressed instead: steps at silhouettes and occlusions
+are removed, large slopes are attenuated logarithmically and small ones
+kept, and the heightmap is rebuilt from the new slopes by solving a
+Poisson equation with Neumann boundaries.
+
+The solver is geometric multigrid on the cell-centred 5-point Laplacian:
+red-black Gauss-Seidel smoothing, 2x2 restriction and bilinear
+prolongation in V-cycles, all on float32 arrays. A 2048 x 2048 map takes
+about a second.
+"""
+
+import numpy as np
+
+# Slopes (depth per unit of coin plane) above this are treated as
+# silhouette or occlusion steps and dropped
+STEP_SLOPE = 8.0
+
+# Strength of the logarithmic slope attenuation; 0 keeps slopes unchanged
+ATTENUATION = 4.0
+
+# Coarsest multigrid level, in cells along the shorter side
+COARSEST = 4
+
+# Stop once the residual is this fraction of the right-hand side
+TOLERANCE = 1e-4
+MAX_CYCLES = 20
+
+# Stop early when a cycle shrinks the residual by less than this factor
+STALL = 0.5
+
+def _fill_ghosts(padded):
+    """Copy the edge cells into the ghost border, which makes the boundary flux zero"""
+    padded[0, 1:-1] = padded[1, 1:-1]
+    padded[-1, 1:-1] = padded[-2, 1:-1]
+    padded[1:-1, 0] = padded[1:-1, 1]
+    padded[1:-1, -1] = padded[1:-1, -2]
+
+def _smooth(padded, rhs, sweeps):
+    """Red-black Gauss-Seidel sweeps of 4h - neighbours = rhs, on a ghost-padded grid of any shape"""
+    n, m = rhs.shape
+    for _ in range(sweeps):
+        for colour in ((0, 0), (1, 1)), ((0, 1), (1, 0)):
+            _fill_ghosts(padded)
+            for i, j in colour:
+                rows = slice(1 + i, n + 1, 2)
+                cols = slice(1 + j, m + 1, 2)
+                total = rhs[i::2, j::2] + padded[i:n:2, cols]
+                total += padded[2 + i:n + 2:2, cols]
+                total += padded[rows, j:m:2]
+                total += padded[rows, 2 + j:m + 2:2]
+                total *= 0.25
+                padded[rows, cols] = total
+
+def _residual(padded, rhs):
+    """rhs - (4h - neighbours)"""
+    _fill_ghosts(padded)
+    out = padded[:-2, 1:-1] + padded[2:, 1:-1]
+    out += padded[1:-1, :-2]
+    out += padded[1:-1, 2:]
+    out -= 4 * padded[1:-1, 1:-1]
+    out += rhs
+    return out
+
+def _restrict(fine):
+    """Sum over 2x2 blocks, the last ones partial on odd sides; coarse cells are twice as wide, so the sum is the right scaling"""
+    n, m = fine.shape
+    coarse = fine[0::2, 0::2].copy()
+    coarse[:, :m // 2] += fine[0::2, 1::2]
+    coarse[:n // 2] += fine[1::2, 0::2]
+    coarse[:n // 2, :m // 2] += fine[1::2, 1::2]
+    return coarse
+
+def _prolong(coarse, out):
+    """Add the bilinear interpolation of cell-centred coarse values to out, a grid twice as fine"""
+    n, m = out.shape
+    c = coarse
+    half = np.empty((n, c.shape[1]), dtype=c.dtype)
+    half[0::2] = 0.75 * c[:(n + 1) // 2]
+    half[0::2] += 0.25 * np.concatenate([c[:1], c[:(n - 1) // 2]])
+    half[1::2] = 0.75 * c[:n // 2]
+    half[1::2] += 0.25 * np.concatenate([c[1:], c[-1:]])[:n // 2]
+    out[:, 0::2] += 0.75 * half[:, :(m + 1) // 2]
+    out[:, 0::2] += 0.25 * np.concatenate([half[:, :1], half[:, :(m - 1) // 2]], axis=1)
+    out[:, 1::2] += 0.75 * half[:, :m // 2]
+    out[:, 1::2] += 0.25 * np.concatenate([half[:, 1:], half[:, -1:]], axis=1)[:, :m // 2]
+
+def _vcycle(padded, rhs, pre=2, post=2):
+    """One V-cycle for 4h - neighbours = rhs, improving padded in place"""
+    n, m = rhs.shape
+    if min(n, m) <= COARSEST:
+        # Rounding leaves the coarse right-hand side slightly inconsistent,
+        # which would only drift the constant the solution is free in
+        _smooth(padded, rhs - rhs.mean(), 20 * max(n, m))
+        return
+
+    _smooth(padded, rhs, pre)
+    coarse_rhs = _restrict(_residual(padded, rhs))
+    coarse = np.zeros((coarse_rhs.shape[0] + 2, coarse_rhs.shape[1] + 2), dtype=rhs.dtype)
+    _vcycle(coarse, coarse_rhs, pre, post)
+    _prolong(coarse[1:-1, 1:-1], padded[1:-1, 1:-1])
+    _smooth(padded, rhs, post)
+
+def integrate(gx, gy, tolerance=TOLERANCE, max_cycles=MAX_CYCLES):
+    """Heights whose forward differences best match gx (along axis 1) and gy (along axis 0)
+
+    gx is (n, m - 1) and gy (n - 1, m); the least-squares solution is found
+    with multigrid V-cycles and returned with zero mean. Cycling stops at
+    the tolerance or once float32 rounding keeps the residual from falling.
+    """
+    n = gy.shape[0] + 1
+    m = gx.shape[1] + 1
+
+    # Divergence of the slopes
+    rhs = np.zeros((n, m), dtype=np.float32)
+    rhs[:, :-1] -= gx
+    rhs[:, 1:] += gx
+    rhs[:-1] -= gy
+    rhs[1:] += gy
+    rhs -= rhs.mean()
+
+    padded = np.zeros((n + 2, m + 2), dtype=np.float32)
+    scale = np.abs(rhs).sum()
+    previous = scale
+    for _ in range(max_cycles):
+        _vcycle(padded, rhs)
+        residual = np.abs(_residual(padded, rhs)).sum()
+        if residual <= tolerance * scale or residual > STALL * previous:
+            break
+        previous = residual
+
+    heights = padded[1:-1, 1:-1].astype(np.float64)
+    return heights - heights.mean()
+
+def attenuate(slope, attenuation=ATTENUATION):
+    """Logarithmic compression of slope magnitudes: about linear for small slopes, log for large ones"""
+    if attenuation <= 0:
+        return slope
+    return np.sign(slope) * np.log1p(attenuation * np.abs(slope)) / attenuation
+
+def compress(buf, relief_depth, cell, step_slope=STEP_SLOPE, attenuation=ATTENUATION):
+    """Gradient-domain version of heightmap.compress: heights in 0..relief_depth, NaN where empty
+
+    buf is a depth buffer in mm with -inf where nothing was hit, and cell
+    the width of its cells in mm.
+    """
+    heights = np.full(buf.shape, np.nan)
+    hit = np.isfinite(buf)
+    if not hit.any():
+        return heights
+    depth = np.where(hit, buf, 0.0)
+
+    def slopes(diff, both):
+        slope = diff / cell
+        keep = both & (np.abs(slope) <= step_slope)
+        return np.where(keep, attenuate(slope, attenuation) * cell, 0.0).astype(np.float32)
+
+    gx = slopes(np.diff(depth, axis=1), hit[:, 1:] & hit[:, :-1])
+    gy = slopes(np.diff(depth, axis=0), hit[1:, :] & hit[:-1, :])
+    solved = integrate(gx, gy)
+
+    low = solved[hit].min()
+    span = solved[hit].max() - low
+    heights[hit] = (solved[hit] - low) / span * relief_depth if span > 0 else 0.0
+    return heights
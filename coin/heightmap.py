@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Heightmap relief engine for coin printing.
+
+Rasterizes a (rotated) mesh into a samples x samples depth buffer over the
+coin disc, keeping the frontmost (largest Z) depth per cell, and turns the
+buffer into a closed heightfield solid on a regular grid.
+
+Only needs NumPy, so it can be used from Blender scripts and plain Python.
+"""
+
+import numpy as np
+
+import adaptive
+import gradient
+
+# Upper bound on candidate cells tested per rasterization pass
+CHUNK_CELLS = 1 << 20
+
+# Grid cells per band when a coin is generated band by band
+BAND_CELLS = 1 << 19
+
+# Smallest grid that leaves a 2x2 block of cells inside the rim gap of a coin solid
+MIN_SAMPLES = 4
+
+def check_samples(samples):
+    """Raise ValueError for a grid too coarse to make a coin solid"""
+    if samples < MIN_SAMPLES:
+        raise ValueError(f"--samples must be at least {MIN_SAMPLES}, got {samples}")
+
+def grid_centers(coin_diameter, samples):
+    """Coordinates of the cell centres along one axis of the coin grid"""
+    cell = coin_diameter / samples
+    return (np.arange(samples) + 0.5) * cell - coin_diameter / 2
+
+def _grid_coords(verts, coin_diameter, samples, fill, center=(0.0, 0.0)):
+    """Vertices scaled so their larger XY extent covers `fill` of the coin and centred on `center` (mm), in grid coordinates"""
+    lo = verts.min(axis=0)
+    hi = verts.max(axis=0)
+    extent = max(hi[0] - lo[0], hi[1] - lo[1])
+    scale = (coin_diameter * fill) / extent if extent > 0 else 1.0
+    cell = coin_diameter / samples
+
+    # Cell centres sit on integer positions
+    gx = ((verts[:, 0] - (lo[0] + hi[0]) / 2) * scale + center[0] + coin_diameter / 2) / cell - 0.5
+    gy = ((verts[:, 1] - (lo[1] + hi[1]) / 2) * scale + center[1] + coin_diameter / 2) / cell - 0.5
+    gz = (verts[:, 2] - lo[2]) * scale
+    return gx, gy, gz
+
+def _depth_rows(gx, gy, gz, tris, coin_diameter, samples, row0, row1):
+    """Rows row0..row1-1 of the depth buffer, from grid coordinates and (T, 3) triangle coordinates"""
+    buf = np.full((row1 - row0) * samples, -np.inf)
+
+    # Splat vertices first so triangles smaller than a cell still register
+    ix = np.rint(gx).astype(np.int64)
+    iy = np.rint(gy).astype(np.int64)
+    ok = (ix >= 0) & (ix < samples) & (iy >= row0) & (iy < row1)
+    np.maximum.at(buf, (iy[ok] - row0) * samples + ix[ok], gz[ok])
+
+    if len(tris[0]):
+        _rasterize_triangles(buf, *tris, samples, row0, row1)
+
+    buf = buf.reshape(row1 - row0, samples)
+
+    # Clip to the coin disc
+    centers = grid_centers(coin_diameter, samples)
+    radius = coin_diameter / 2
+    outside = centers[None, :] ** 2 + centers[row0:row1, None] ** 2 > radius ** 2
+    buf[outside] = -np.inf
+
+    return buf
+
+def depth_buffer(verts, faces, coin_diameter, samples, fill=0.85, center=(0.0, 0.0)):
+    """Rasterize the frontmost surface of a triangle mesh into a depth buffer
+
+    The mesh is scaled uniformly so its larger XY extent covers `fill` of
+    the coin diameter and centred in XY on `center`, in mm from the middle
+    of the coin. Returns a (samples, samples) array
+    indexed [y, x] holding the largest Z per cell in mm, -inf where nothing
+    was hit or the cell lies outside the coin disc.
+    """
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    gx, gy, gz = _grid_coords(verts, coin_diameter, samples, fill, center)
+    return _depth_rows(gx, gy, gz, (gx[faces], gy[faces], gz[faces]), coin_diameter, samples, 0, samples)
+
+def _corner_min(t):
+    """Smallest of the three corner values of (T, 3) triangles; much faster than min(axis=1)"""
+    return np.minimum(np.minimum(t[:, 0], t[:, 1]), t[:, 2])
+
+def _corner_max(t):
+    """Largest of the three corner values of (T, 3) triangles"""
+    return np.maximum(np.maximum(t[:, 0], t[:, 1]), t[:, 2])
+
+def _rasterize_triangles(buf, x, y, z, samples, row0=0, row1=None):
+    """Z-buffer triangles given as (T, 3) grid coordinates into a flat buffer
+
+    The buffer holds grid rows row0..row1-1 (all rows by default).
+    """
+    if row1 is None:
+        row1 = samples
+
+    # Cell-centre bounding box of every triangle, clipped to the rows held
+    x0 = np.clip(np.ceil(_corner_min(x)), 0, samples).astype(np.int64)
+    x1 = np.clip(np.floor(_corner_max(x)), -1, samples - 1).astype(np.int64)
+    y0 = np.clip(np.ceil(_corner_min(y)), row0, row1).astype(np.int64)
+    y1 = np.clip(np.floor(_corner_max(y)), row0 - 1, row1 - 1).astype(np.int64)
+    nx = np.maximum(x1 - x0 + 1, 0)
+    ny = np.maximum(y1 - y0 + 1, 0)
+    counts = nx * ny
+
+    # Twice the signed area; edge-on triangles are covered by their neighbours
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+    todo = np.nonzero((counts > 0) & (np.abs(area) > 1e-12))[0]
+    if len(todo) == 0:
+        return
+
+    # Split into passes of roughly CHUNK_CELLS candidate cells each
+    ends = np.cumsum(counts[todo])
+    bounds = np.searchsorted(ends, np.arange(CHUNK_CELLS, ends[-1], CHUNK_CELLS))
+    for tris in np.split(todo, np.unique(bounds)):
+        if len(tris) == 0:
+            continue
+        n = counts[tris]
+        rep = np.repeat(tris, n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        px = x0[rep] + k % nx[rep]
+        py = y0[rep] + k // nx[rep]
+
+        tx = x[rep]
+        ty = y[rep]
+        a = area[rep]
+        w0 = ((tx[:, 1] - px) * (ty[:, 2] - py) - (tx[:, 2] - px) * (ty[:, 1] - py)) / a
+        w1 = ((tx[:, 2] - px) * (ty[:, 0] - py) - (tx[:, 0] - px) * (ty[:, 2] - py)) / a
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= -1e-9) & (w1 >= -1e-9) & (w2 >= -1e-9)
+
+        tz = z[rep[inside]]
+        depth = w0[inside] * tz[:, 0] + w1[inside] * tz[:, 1] + w2[inside] * tz[:, 2]
+        np.maximum.at(buf, (py[inside] - row0) * samples + px[inside], depth)
+
+def front_faces(verts, faces):
+    """Mask of the faces turned towards a viewer on +Z: counter-clockwise in XY"""
+    tri = verts[faces]
+    area = ((tri[:, 1, 0] - tri[:, 0, 0]) * (tri[:, 2, 1] - tri[:, 0, 1])
+            - (tri[:, 2, 0] - tri[:, 0, 0]) * (tri[:, 1, 1] - tri[:, 0, 1]))
+    return area > 0
+
+def visible_faces(verts, faces, samples=1024, tolerance=2.0):
+    """Mask of the faces on the front shell of a mesh seen from +Z
+
+    Faces turned away from the viewer are dropped first. The rest are
+    z-buffered on a samples x samples grid over the mesh, and a face is kept
+    when its centroid or a point near one of its corners lies within
+    `tolerance` cells of the frontmost depth there.
+    """
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    tri = verts[faces]
+    front = np.nonzero(front_faces(verts, faces))[0]
+    visible = np.zeros(len(faces), dtype=bool)
+    if len(front) == 0:
+        return visible
+
+    lo = verts.min(axis=0)
+    hi = verts.max(axis=0)
+    cell = max(hi[0] - lo[0], hi[1] - lo[1]) / samples
+    if cell <= 0:
+        visible[front] = True
+        return visible
+
+    # Same grid convention as depth_buffer, in mesh units
+    grid = tri[front]
+    gx = (grid[..., 0] - lo[0]) / cell - 0.5
+    gy = (grid[..., 1] - lo[1]) / cell - 0.5
+    buf = np.full(samples * samples, -np.inf)
+    _rasterize_triangles(buf, gx, gy, grid[..., 2], samples)
+
+    # Test points: the centroid, and each corner pulled a fifth of the way in
+    centroid = grid.mean(axis=1, keepdims=True)
+    points = np.concatenate([centroid, grid * 0.8 + centroid * 0.2], axis=1)
+    px = np.clip(np.rint((points[..., 0] - lo[0]) / cell - 0.5), 0, samples - 1).astype(np.int64)
+    py = np.clip(np.rint((points[..., 1] - lo[1]) / cell - 0.5), 0, samples - 1).astype(np.int64)
+    front_z = buf[py * samples + px]
+    visible[front] = (points[..., 2] >= front_z - tolerance * cell).any(axis=1)
+    return visible
+
+def compress(buf, relief_depth):
+    """Map frontmost depths linearly onto 0..relief_depth, NaN where empty"""
+    heights = np.full(buf.shape, np.nan)
+    hit = np.isfinite(buf)
+    if not hit.any():
+        return heights
+
+    min_z = buf[hit].min()
+    depth = buf[hit].max() - min_z
+    heights[hit] = (buf[hit] - min_z) / depth * relief_depth if depth > 0 else 0.0
+    return heights
+
+def _quad_mask(valid):
+    """Grid quads with all four corners valid, with diagonal pinches removed"""
+    quads = valid[:-1, :-1] & valid[:-1, 1:] & valid[1:, :-1] & valid[1:, 1:]
+
+    # Two quads touching only at a corner would give a non-manifold vertex;
+    # drop one of them until no such pair is left
+    while True:
+        q00 = quads[:-1, :-1]
+        q01 = quads[:-1, 1:]
+        q10 = quads[1:, :-1]
+        q11 = quads[1:, 1:]
+        main = q00 & q11 & ~q01 & ~q10
+        anti = q01 & q10 & ~q00 & ~q11
+        if not (main.any() or anti.any()):
+            return quads
+        quads[1:, 1:][main] = False
+        quads[1:, :-1][anti] = False
+
+def grid_surface(heights, coin_diameter, base_z=0.0, max_error=None):
+    """Triangulate the valid (finite) cells of a heightmap as a grid surface
+
+    Returns float32 vertices at the used cell centres, int32 triangles
+    counter-clockwise seen from +Z, and the boundary as directed edges
+    (start, end) with the surface on their left. With max_error in mm the
+    same region is meshed by adaptive_surface instead.
+    """
+    if max_error is not None:
+        return adaptive_surface(heights, coin_diameter, base_z, max_error)
+
+    samples = heights.shape[0]
+    centers = grid_centers(coin_diameter, samples)
+    quads = _quad_mask(np.isfinite(heights))
+
+    # Only keep cell centres that are a corner of some quad
+    used = np.zeros(heights.shape, dtype=bool)
+    used[:-1, :-1] |= quads
+    used[:-1, 1:] |= quads
+    used[1:, :-1] |= quads
+    used[1:, 1:] |= quads
+    count = int(used.sum())
+    index = np.full(heights.shape, -1, dtype=np.int64)
+    index[used] = np.arange(count)
+
+    # Top triangles, counter-clockwise seen from +Z
+    a = index[:-1, :-1][quads]
+    b = index[:-1, 1:][quads]
+    c = index[1:, 1:][quads]
+    d = index[1:, :-1][quads]
+    faces = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+
+    # Boundary edges are grid edges with a quad on one side only, directed
+    # the same way as in that quad
+    padded = np.zeros((samples + 1, samples + 1), dtype=bool)
+    padded[1:-1, 1:-1] = quads
+    above = padded[1:, 1:-1]
+    below = padded[:-1, 1:-1]
+    right = padded[1:-1, 1:]
+    left = padded[1:-1, :-1]
+    rim = [
+        (index[:, :-1][above & ~below], index[:, 1:][above & ~below]),
+        (index[:, 1:][below & ~above], index[:, :-1][below & ~above]),
+        (index[1:, :][right & ~left], index[:-1, :][right & ~left]),
+        (index[:-1, :][left & ~right], index[1:, :][left & ~right]),
+    ]
+    u = np.concatenate([start for start, end in rim])
+    v = np.concatenate([end for start, end in rim])
+
+    yy, xx = np.nonzero(used)
+    verts = np.empty((count, 3), dtype=np.float32)
+    verts[:, 0] = centers[xx]
+    verts[:, 1] = centers[yy]
+    verts[:, 2] = base_z + heights[used]
+
+    return verts, faces, (u, v)
+
+def adaptive_surface(heights, coin_diameter, base_z, max_error):
+    """grid_surface with triangles grown wherever the heightmap stays within max_error mm of them"""
+    centers = grid_centers(coin_diameter, heights.shape[0])
+    corners = adaptive.triangulate(heights, _quad_mask(np.isfinite(heights)), max_error)
+
+    used = np.zeros(heights.shape, dtype=bool)
+    used.ravel()[corners.ravel()] = True
+    count = int(used.sum())
+    index = np.full(heights.size, -1, dtype=np.int64)
+    index[used.ravel()] = np.arange(count)
+    faces = index[corners]
+
+    yy, xx = np.nonzero(used)
+    verts = np.empty((count, 3), dtype=np.float32)
+    verts[:, 0] = centers[xx]
+    verts[:, 1] = centers[yy]
+    verts[:, 2] = base_z + heights[used]
+
+    return verts, faces, adaptive.boundary_edges(faces)
+
+def grid_solid(heights, coin_diameter, base_z=0.0, floor=0.0, max_error=None):
+    """Build a closed heightfield solid from a heightmap
+
+    The top surface puts each valid cell centre at base_z + height, the
+    boundary of the covered region gets vertical walls down to `floor`, and
+    the bottom is a flat copy of the top at `floor`. Returns float32 vertices
+    and int32 triangle indices with outward facing winding. max_error is
+    passed on to grid_surface.
+    """
+    top_verts, top, (u, v) = grid_surface(heights, coin_diameter, base_z, max_error)
+    count = len(top_verts)
+
+    walls = np.concatenate([
+        np.stack([u, u + count, v], axis=1),
+        np.stack([v, u + count, v + count], axis=1),
+    ])
+    bottom = top[:, ::-1] + count
+
+    verts = np.empty((2 * count, 3), dtype=np.float32)
+    verts[:count] = top_verts
+    verts[count:, :2] = top_verts[:, :2]
+    verts[count:, 2] = floor
+
+    faces = np.concatenate([top, walls, bottom]).astype(np.int32)
+    return verts, faces
+
+def _boundary_loop(u, v, count):
+    """Order directed boundary edges forming one closed loop into a vertex list"""
+    following = np.full(count, -1, dtype=np.int64)
+    following[u] = v
+    loop = np.empty(len(u), dtype=np.int64)
+    vertex = u[0]
+    for i in range(len(u)):
+        loop[i] = vertex
+        vertex = following[vertex]
+    if vertex != u[0]:
+        raise ValueError("Heightmap boundary is not a single loop")
+    return loop
+
+def coin_solid(heights, coin_diameter, thickness=3.0, base_z=0.0, max_error=None, back=None):
+    """Build the whole coin as one watertight solid from a relief heightmap
+
+    The top is the relief grid over the coin disc, with empty cells flat at
+    base_z. Its staircase boundary is stitched to a circular rim of radius
+    coin_diameter / 2, which drops to a flat bottom cap at base_z - thickness.
+    With a back heightmap, the reverse as seen from below, the bottom is
+    that relief instead, stitched to the rim the same way. No boolean is
+    involved and the result is manifold by construction. max_error is
+    passed on to grid_surface.
+    """
+    samples = heights.shape[0]
+    check_samples(samples)
+    cell = coin_diameter / samples
+    radius = coin_diameter / 2
+    centers = grid_centers(coin_diameter, samples)
+
+    # Keep a gap of at least one cell between the grid and the rim
+    inside = centers[None, :] ** 2 + centers[:, None] ** 2 <= (radius - cell) ** 2
+
+    def surface(face):
+        return grid_surface(np.where(inside, np.nan_to_num(face, nan=0.0), np.nan), coin_diameter, base_z, max_error)
+
+    top_verts, top, (u, v) = surface(heights)
+    count = len(top_verts)
+
+    # Rim vertices sit on the circle at the angle of each boundary vertex
+    loop = _boundary_loop(u, v, count)
+    n = len(loop)
+    angles = np.arctan2(top_verts[loop, 1], top_verts[loop, 0])
+    ring = np.stack([np.cos(angles), np.sin(angles)], axis=1) * radius
+
+    rim_top = count + np.arange(n)
+    rim_bottom = rim_top + n
+    k = np.arange(n)
+    k1 = (k + 1) % n
+    faces = [
+        top,
+        # Strip between the staircase and the circle
+        np.stack([loop[k], rim_top[k], rim_top[k1]], axis=1),
+        np.stack([loop[k], rim_top[k1], loop[k1]], axis=1),
+        # Side wall
+        np.stack([rim_top[k], rim_bottom[k], rim_top[k1]], axis=1),
+        np.stack([rim_top[k1], rim_bottom[k], rim_bottom[k1]], axis=1),
+    ]
+
+    if back is None:
+        bottom_verts = np.array([[0, 0, base_z - thickness]], dtype=np.float32)
+        bottom_center = count + 2 * n
+        faces.append(np.stack([np.full(n, bottom_center), rim_bottom[k1], rim_bottom[k]], axis=1))
+    else:
+        # Turn the reverse half a turn about Y, which keeps its winding
+        # outward, and hang it below the blank
+        bottom_verts, bottom, _ = surface(back)
+        bottom_verts[:, 0] *= -1
+        bottom_verts[:, 2] = 2 * base_z - thickness - bottom_verts[:, 2]
+        offset = count + 2 * n
+
+        # The disc is symmetric, so the reverse has its staircase on the
+        # same cells; find them by grid position
+        def cell_key(points):
+            col = np.rint((points[:, 0] + radius) / cell - 0.5).astype(np.int64)
+            row = np.rint((points[:, 1] + radius) / cell - 0.5).astype(np.int64)
+            return row * samples + col
+
+        at = np.full(samples * samples, -1, dtype=np.int64)
+        at[cell_key(bottom_verts)] = np.arange(len(bottom_verts))
+        back_loop = at[cell_key(top_verts[loop])]
+        if np.any(back_loop < 0):
+            raise ValueError("Heightmap boundaries of the two faces differ")
+        back_loop += offset
+        faces += [
+            bottom + offset,
+            np.stack([back_loop[k], rim_bottom[k1], rim_bottom[k]], axis=1),
+            np.stack([back_loop[k], back_loop[k1], rim_bottom[k1]], axis=1),
+        ]
+    faces = np.concatenate(faces).astype(np.int32)
+
+    verts = np.empty((count + 2 * n + len(bottom_verts), 3), dtype=np.float32)
+    verts[:count] = top_verts
+    verts[rim_top, :2] = ring
+    verts[rim_top, 2] = base_z
+    verts[rim_bottom, :2] = ring
+    verts[rim_bottom, 2] = base_z - thickness
+    verts[count + 2 * n:] = bottom_verts
+
+    return verts, faces
+
+def _rim_triangles(p, q, radius, base_z, thickness):
+    """Strip, side wall and bottom cap of coin_solid for directed boundary edges p -> q, as (T, 3, 3)"""
+    def ring(points, z):
+        angles = np.arctan2(points[:, 1], points[:, 0])
+        out = np.empty(points.shape, dtype=np.float32)
+        out[:, 0] = np.cos(angles) * radius
+        out[:, 1] = np.sin(angles) * radius
+        out[:, 2] = z
+        return out
+
+    top_p, top_q = ring(p, base_z), ring(q, base_z)
+    bottom_p, bottom_q = ring(p, base_z - thickness), ring(q, base_z - thickness)
+    center = np.zeros(p.shape, dtype=np.float32)
+    center[:, 2] = base_z - thickness
+    return np.concatenate([
+        np.stack([p, top_p, top_q], axis=1),
+        np.stack([p, top_q, q], axis=1),
+        np.stack([top_p, bottom_p, top_q], axis=1),
+        np.stack([top_q, bottom_p, bottom_q], axis=1),
+        np.stack([center, bottom_q, bottom_p], axis=1),
+    ])
+
+def coin_bands(verts, faces, coin_diameter, relief_depth, samples, thickness=3.0, base_z=0.0):
+    """Generate the coin_solid of a rotated mesh band by band as (T, 3, 3) triangle arrays
+
+    Same solid as coin_solid(relief_heights(...)), written as a triangle
+    soup: only a band of about BAND_CELLS grid cells is held at a time, so
+    memory does not grow with samples. The mesh is rasterized twice, once
+    for the depth range used by compress and once to emit the bands.
+    """
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    check_samples(samples)
+    cell = coin_diameter / samples
+    radius = coin_diameter / 2
+    centers = grid_centers(coin_diameter, samples)
+    band = max(1, BAND_CELLS // samples)
+
+    gx, gy, gz = _grid_coords(verts, coin_diameter, samples, fill=0.85)
+    tris = (gx[faces], gy[faces], gz[faces])
+    low = _corner_min(tris[1])
+    high = _corner_max(tris[1])
+
+    def depth(row0, row1):
+        near = (low <= row1 - 1) & (high >= row0)
+        return _depth_rows(gx, gy, gz, tuple(t[near] for t in tris), coin_diameter, samples, row0, row1)
+
+    # Depth range over the whole disc, as compress takes it
+    min_z, max_z = np.inf, -np.inf
+    for row0 in range(0, samples, band):
+        buf = depth(row0, min(row0 + band, samples))
+        hit = buf[np.isfinite(buf)]
+        if len(hit):
+            min_z = min(min_z, hit.min())
+            max_z = max(max_z, hit.max())
+    scale = relief_depth / (max_z - min_z) if max_z > min_z else 0.0
+
+    # Bands of quad rows row0..row1-1, which use vertex rows row0..row1 and
+    # the disc mask from row0 - 1 for the boundary edges shared with the band before
+    for row0 in range(0, samples - 1, band):
+        row1 = min(row0 + band, samples - 1)
+        last = row1 == samples - 1
+
+        buf = depth(row0, row1 + 1)
+        heights = np.where(np.isfinite(buf), (buf - min_z) * scale, 0.0)
+        points = np.empty((row1 - row0 + 1, samples, 3), dtype=np.float32)
+        points[..., 0] = centers[None, :]
+        points[..., 1] = centers[row0:row1 + 1, None]
+        points[..., 2] = base_z + heights
+
+        # Keep a gap of at least one cell between the grid and the rim
+        ys = centers[max(row0 - 1, 0):row1 + 1]
+        inside = centers[None, :] ** 2 + ys[:, None] ** 2 <= (radius - cell) ** 2
+        quads = inside[:-1, :-1] & inside[:-1, 1:] & inside[1:, :-1] & inside[1:, 1:]
+        if row0 == 0:
+            quads = np.concatenate([np.zeros((1, samples - 1), dtype=bool), quads])
+        own = quads[1:]
+
+        # Top triangles, counter-clockwise seen from +Z
+        a = points[:-1, :-1][own]
+        b = points[:-1, 1:][own]
+        c = points[1:, 1:][own]
+        d = points[1:, :-1][own]
+        parts = [np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)]
+
+        # Boundary edges directed as in their quad: grid rows row0..row1-1
+        # (and the last row in the last band), then grid columns
+        rows = row1 - row0 + (1 if last else 0)
+        padded = np.concatenate([quads, np.zeros((1, samples - 1), dtype=bool)])
+        above = padded[1:rows + 1]
+        below = padded[:rows]
+        row_points = points[:rows]
+        sides = np.pad(own, ((0, 0), (1, 1)))
+        right = sides[:, 1:]
+        left = sides[:, :-1]
+        rim = [
+            (row_points[:, :-1][above & ~below], row_points[:, 1:][above & ~below]),
+            (row_points[:, 1:][below & ~above], row_points[:, :-1][below & ~above]),
+            (points[1:][right & ~left], points[:-1][right & ~left]),
+            (points[:-1][left & ~right], points[1:][left & ~right]),
+        ]
+        p = np.concatenate([start for start, end in rim])
+        q = np.concatenate([end for start, end in rim])
+        parts.append(_rim_triangles(p, q, radius, base_z, thickness))
+
+        band_tris = np.concatenate(parts)
+        if len(band_tris):
+            yield band_tris
+
+def relief_heights(verts, faces, coin_diameter, relief_depth, samples, compression='linear', fill=0.85,
+                   center=(0.0, 0.0)):
+    """Rasterize a rotated mesh into a relief heightmap in mm, NaN where empty
+
+    compression is 'linear' (compress) or 'gradient' (gradient.compress);
+    fill and center place the mesh as in depth_buffer.
+    """
+    buf = depth_buffer(verts, faces, coin_diameter, samples, fill, center)
+    if compression == 'gradient':
+        return gradient.compress(buf, relief_depth, coin_diameter / samples)
+    if compression != 'linear':
+        raise ValueError(f"Unknown compression '{compression}'")
+    return compress(buf, relief_depth)
+
+def relief_solid(verts, faces, coin_diameter, relief_depth, samples, base_z=0.0, floor=0.0, compression='linear',
+                 max_error=None):
+    """Rasterize a rotated mesh and return the relief as a closed grid solid"""
+    heights = relief_heights(verts, faces, coin_diameter, relief_depth, samples, compression)
+    return grid_solid(heights, coin_diameter, base_z=base_z, floor=floor, max_error=max_error)
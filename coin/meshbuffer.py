@@ -0,0 +1,75 @@
+"""
+Array-backed mesh shared by the pipeline stages.
+
+A MeshBuffer holds vertex coordinates and triangles as contiguous float32
+and int32 arrays. Stages (rotate, scale, depth compression, placement)
+edit the coordinates in place, and the Blender scripts read an object into
+a buffer once and write it back once, instead of round-tripping through
+the object after every step.
+"""
+
+import numpy as np
+
+# Rows per step of an in-place matrix product, bounding its temporary
+CHUNK_ROWS = 1 << 18
+
+class MeshBuffer:
+    """Vertex coordinates and triangle indices edited in place
+
+    The arrays are used as given when they already have the right dtype and
+    are writable; copy=True always takes a private copy of the vertices, for
+    meshes shared between jobs.
+    """
+
+    def __init__(self, verts, faces, copy=False):
+        if copy:
+            self.verts = np.array(verts, dtype=np.float32, order='C')
+        else:
+            self.verts = np.require(verts, dtype=np.float32, requirements=['C', 'W'])
+        self.verts = self.verts.reshape(-1, 3)
+        self.faces = np.require(faces, dtype=np.int32, requirements=['C']).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.verts)
+
+    def arrays(self):
+        """The (verts, faces) pair"""
+        return self.verts, self.faces
+
+    def bounds(self):
+        """Per-axis minimum and maximum as two length-3 arrays"""
+        return self.verts.min(axis=0), self.verts.max(axis=0)
+
+    def transform(self, matrix, offset=None):
+        """Apply a 3x3 matrix and then an optional offset to every vertex"""
+        m = np.asarray(matrix, dtype=np.float32).T
+        for start in range(0, len(self.verts), CHUNK_ROWS):
+            block = self.verts[start:start + CHUNK_ROWS]
+            block[:] = block @ m
+        if offset is not None:
+            self.translate(offset)
+        return self
+
+    def scale(self, factors):
+        """Scale uniformly, or per axis when given three factors"""
+        self.verts *= np.asarray(factors, dtype=np.float32)
+        return self
+
+    def replace(self, verts, faces):
+        """Take over new arrays produced by a stage that changes the topology"""
+        self.__init__(verts, faces)
+        return self
+
+    def keep_faces(self, mask):
+        """Keep only the faces selected by mask and drop the vertices left unused"""
+        faces = self.faces[mask]
+        used = np.zeros(len(self.verts), dtype=bool)
+        used[faces] = True
+        remap = (np.cumsum(used) - 1).astype(np.int32)
+        self.verts = self.verts[used]
+        self.faces = remap[faces]
+        return self
+
+    def translate(self, offset):
+        self.verts += np.asarray(offset, dtype=np.float32)
+        return self
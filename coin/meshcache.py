@@ -0,0 +1,95 @@
+"""
+Content-addressed on-disk cache of imported meshes.
+
+Entries are keyed by the SHA-256 of the input file and the importer version
+and hold the joined vertex and triangle arrays as raw .npy files, so a hit
+is a memory map with no parsing. The cache is capped in size and evicts the
+least recently used entries first.
+"""
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "coin-relief")
+DEFAULT_MAX_MB = 1024
+
+def file_key(filepath, version):
+    """Hash of the file contents and the importer version"""
+    digest = hashlib.sha256(version.encode())
+    with open(filepath, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _paths(cache_dir, key):
+    return (os.path.join(cache_dir, key + ".verts.npy"),
+            os.path.join(cache_dir, key + ".faces.npy"))
+
+def load(cache_dir, key):
+    """Memory-map a cached mesh, or return None on a miss"""
+    verts_path, faces_path = _paths(cache_dir, key)
+    try:
+        verts = np.load(verts_path, mmap_mode='r')
+        faces = np.load(faces_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    # Touch both files so eviction sees them as recently used
+    for path in (verts_path, faces_path):
+        os.utime(path)
+    return verts, faces
+
+def store(cache_dir, key, verts, faces, max_mb=DEFAULT_MAX_MB):
+    """Write a mesh into the cache and evict old entries over the size cap"""
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = (np.asarray(verts, dtype=np.float32), np.asarray(faces, dtype=np.int32))
+    for path, array in zip(_paths(cache_dir, key), arrays):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as fh:
+            np.save(fh, np.ascontiguousarray(array))
+        os.replace(tmp, path)
+    evict(cache_dir, max_mb)
+
+def evict(cache_dir, max_mb=DEFAULT_MAX_MB):
+    """Delete least recently used entries until the cache fits in max_mb"""
+    entries = {}
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npy"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key = name.split(".", 1)[0]
+        size, mtime = entries.get(key, (0, 0.0))
+        entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+    total = sum(size for size, mtime in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k][1]):
+        if total <= max_mb * 1024 * 1024:
+            break
+        for path in _paths(cache_dir, key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= entries[key][0]
+
+def cached_import(filepath, importer, version, cache_dir=DEFAULT_DIR, max_mb=DEFAULT_MAX_MB):
+    """Return (verts, faces) for filepath, calling importer(filepath) only on a miss"""
+    key = file_key(filepath, version)
+    hit = load(cache_dir, key)
+    if hit is not None:
+        print("Using cached mesh")
+        return hit
+
+    verts, faces = importer(filepath)
+    try:
+        store(cache_dir, key, verts, faces, max_mb)
+    except OSError as e:
+        print(f"Warning: could not write mesh cache: {e}")
+    return verts, faces
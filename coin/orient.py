@@ -0,0 +1,131 @@
+"""
+Automatic choice of the view rotation for a relief.
+
+Candidate view directions are spread evenly over the sphere and every one
+is scored at once with a few matrix products:
+
+  - visible area: area of the faces turned towards the viewer, projected
+    onto the coin, as a fraction of the whole surface;
+  - silhouette fill: that projected area over the disc the relief is
+    scaled into, so long thin views lose against round ones;
+  - depth range: depth along the view over the width of the relief, which
+    the depth compression has to squash into relief_depth.
+
+Face normals are summed into direction bins first and the extents are
+taken over a fixed sample of vertices, so the cost barely depends on the
+size of the capture.
+
+Usage:
+    python3 orient.py model.usda
+"""
+
+import sys
+import math
+import numpy as np
+
+# Candidate view directions over the sphere
+CANDIDATES = 4096
+
+# Direction bins per axis for the area-weighted face normals
+NORMAL_BINS = 16
+
+# Vertices sampled for the projected extents
+SAMPLE_VERTICES = 2048
+
+# Faces sampled for the normal bins of large meshes
+SAMPLE_FACES = 1 << 18
+
+def sphere_directions(count):
+    """Unit vectors spread evenly over the sphere (Fibonacci lattice)"""
+    k = np.arange(count) + 0.5
+    z = 1 - 2 * k / count
+    r = np.sqrt(1 - z ** 2)
+    phi = k * math.pi * (3 - math.sqrt(5))
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+
+def view_angles(directions):
+    """rotate-x and rotate-y in degrees that turn each direction towards +Z, with rotate-z at 0"""
+    x = np.arctan2(directions[:, 1], directions[:, 2])
+    y = np.arctan2(-directions[:, 0], np.hypot(directions[:, 1], directions[:, 2]))
+    return np.degrees(x), np.degrees(y)
+
+def view_matrices(angle_x, angle_y, angle_z):
+    """Batched rotation_matrix for arrays of rotate-x and rotate-y and one rotate-z, as (N, 3, 3)"""
+    x = np.radians(angle_x)
+    y = np.radians(angle_y)
+    z = math.radians(angle_z)
+    cx, sx, cy, sy = np.cos(x), np.sin(x), np.cos(y), np.sin(y)
+    zero, one = np.zeros_like(x), np.ones_like(x)
+    rx = np.stack([one, zero, zero, zero, cx, -sx, zero, sx, cx], axis=1).reshape(-1, 3, 3)
+    ry = np.stack([cy, zero, sy, zero, one, zero, -sy, zero, cy], axis=1).reshape(-1, 3, 3)
+    rz = np.array([[math.cos(z), -math.sin(z), 0], [math.sin(z), math.cos(z), 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+def binned_normals(verts, faces, bins=NORMAL_BINS):
+    """Area vectors of the faces (normal times area) summed per direction bin, and the total area
+
+    Large meshes are estimated from an evenly strided sample of SAMPLE_FACES faces.
+    """
+    v = np.asarray(verts, dtype=np.float32)
+    f = np.asarray(faces).reshape(-1, 3)
+    step = max(1, len(f) // SAMPLE_FACES)
+    f = f[::step]
+    a = v[f[:, 0]]
+    area = np.cross(v[f[:, 1]] - a, v[f[:, 2]] - a) * (step / 2)
+    length = np.sqrt(np.einsum('ij,ij->i', area, area))
+    unit = area / np.where(length > 0, length, 1)[:, None]
+
+    cell = np.clip(((unit + 1) / 2 * bins).astype(np.int64), 0, bins - 1)
+    key = (cell[:, 0] * bins + cell[:, 1]) * bins + cell[:, 2]
+    summed = np.stack([np.bincount(key, area[:, k], bins ** 3) for k in range(3)], axis=1)
+    return summed[np.any(summed != 0, axis=1)], float(length.sum())
+
+def sample_vertices(verts, count=SAMPLE_VERTICES):
+    """Evenly strided sample of the vertices plus the extremes along each axis"""
+    verts = np.asarray(verts, dtype=np.float32)
+    step = max(1, len(verts) // count)
+    extremes = np.concatenate([verts.argmin(axis=0), verts.argmax(axis=0)])
+    return np.concatenate([verts[::step], verts[extremes]])
+
+def score_views(verts, faces, matrices):
+    """Score of every view rotation in matrices (N, 3, 3); higher is better"""
+    normals, total = binned_normals(verts, faces)
+    points = sample_vertices(verts)
+
+    def extent(axis):
+        projected = points @ matrices[:, axis, :].T.astype(np.float32)
+        return projected.max(axis=0) - projected.min(axis=0)
+
+    # Row 2 of each matrix is the view direction in world space
+    visible = np.maximum(normals @ matrices[:, 2, :].T, 0).sum(axis=0)
+    width = np.maximum(extent(0), extent(1))
+    depth = extent(2)
+
+    disc = math.pi / 4 * np.maximum(width, 1e-12) ** 2
+    fill = np.minimum(visible / disc, 1.0)
+    flatness = width / (width + depth)
+    return visible / max(total, 1e-12) * fill * flatness
+
+def best_rotation(verts, faces, rotation_z=0.0, candidates=CANDIDATES):
+    """Rotation dict in degrees for the best scoring view, keeping rotation_z"""
+    angle_x, angle_y = view_angles(sphere_directions(candidates))
+    scores = score_views(verts, faces, view_matrices(angle_x, angle_y, rotation_z))
+    best = int(np.argmax(scores))
+    return {'x': round(float(angle_x[best]), 1), 'y': round(float(angle_y[best]), 1), 'z': rotation_z}
+
+def main():
+    import time
+    import relief
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 orient.py model.usda")
+        sys.exit(1)
+
+    verts, faces = relief.load_mesh(sys.argv[1])
+    start = time.perf_counter()
+    rotation = best_rotation(verts, faces)
+    print(f"--rotate-x {rotation['x']:g} --rotate-y {rotation['y']:g} "
+          f"({time.perf_counter() - start:.2f}s for {CANDIDATES} views)")
+
+if __name__ == "__main__":
+    main()
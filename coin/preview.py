@@ -0,0 +1,118 @@
+"""
+Quick previews of the coin face for choosing a rotation.
+
+--preview out.png stops after the import and writes a hill-shaded
+heightmap of the coin face at PREVIEW_SAMPLES cells. With --preview-grid
+<degrees> it writes a contact sheet instead: one tile per rotate-x (rows,
+top to bottom) and rotate-y (columns, left to right) from -90 to 90 in that
+step, all with the given rotate-z. The mesh is vertex-clustered once to
+about a cell per vertex, so every view is one cheap z-buffer pass however
+dense the scan is.
+
+PNG files are written with zlib alone.
+"""
+
+import zlib
+import struct
+import numpy as np
+
+import heightmap
+import relief
+
+# Resolution of a single preview and of each contact sheet tile
+PREVIEW_SAMPLES = 256
+TILE_SAMPLES = 128
+
+# Light from the upper left, as on a struck coin photographed for a catalogue
+LIGHT = np.array([-1.0, 1.0, 1.5]) / np.linalg.norm([-1.0, 1.0, 1.5])
+
+def coarsen(verts, faces, cells):
+    """Vertex-clustered copy of a mesh with about `cells` clusters along its largest extent"""
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    lo = verts.min(axis=0)
+    size = (verts.max(axis=0) - lo).max() / cells
+    if size <= 0:
+        return verts, faces
+
+    key = np.floor((verts - lo) / size).astype(np.int64)
+    dims = key.max(axis=0) + 1
+    _, cluster = np.unique((key[:, 0] * dims[1] + key[:, 1]) * dims[2] + key[:, 2], return_inverse=True)
+    cluster = cluster.ravel()
+    count = np.bincount(cluster)
+    points = np.stack([np.bincount(cluster, verts[:, k], len(count)) for k in range(3)], axis=1) / count[:, None]
+
+    faces = cluster[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    return points, faces[keep]
+
+def shade(heights, coin_diameter):
+    """Hill-shaded greyscale image of a relief heightmap, north up, white outside the coin"""
+    samples = heights.shape[0]
+    cell = coin_diameter / samples
+    dy, dx = np.gradient(np.nan_to_num(heights, nan=0.0), cell)
+    normal = np.stack([-dx, -dy, np.ones_like(dx)], axis=-1)
+    normal /= np.linalg.norm(normal, axis=-1, keepdims=True)
+    value = 0.25 + 0.75 * np.clip(normal @ LIGHT, 0, 1)
+
+    centers = heightmap.grid_centers(coin_diameter, samples)
+    outside = centers[None, :] ** 2 + centers[:, None] ** 2 > (coin_diameter / 2) ** 2
+    value[outside] = 1.0
+
+    # Heightmap rows run up the Y axis, image rows down
+    return np.flipud(np.rint(value * 255).astype(np.uint8))
+
+def render(verts, faces, rotation, coin_diameter, relief_depth, samples):
+    """Shaded image of the coin face for one rotation"""
+    heights = heightmap.relief_heights(relief.rotate(verts, rotation), faces, coin_diameter, relief_depth, samples)
+    return shade(heights, coin_diameter)
+
+def grid_angles(step):
+    """Angles from -90 to 90 degrees in the given step"""
+    return np.arange(-90.0, 90.0 + 1e-9, step)
+
+def contact_sheet(verts, faces, rotation_z, step, coin_diameter, relief_depth, samples=TILE_SAMPLES, gap=4):
+    """One tile per rotate-x (rows) and rotate-y (columns) combination, on a white sheet"""
+    angles = grid_angles(step)
+    n = len(angles)
+    pitch = samples + gap
+    sheet = np.full((n * pitch + gap, n * pitch + gap), 255, dtype=np.uint8)
+    for row, x in enumerate(angles):
+        for col, y in enumerate(angles):
+            tile = render(verts, faces, {'x': x, 'y': y, 'z': rotation_z}, coin_diameter, relief_depth, samples)
+            top = gap + row * pitch
+            left = gap + col * pitch
+            sheet[top:top + samples, left:left + samples] = tile
+    return sheet
+
+def write_png(filepath, image):
+    """Write an 8-bit greyscale image as PNG"""
+    height, width = image.shape
+    rows = np.empty((height, width + 1), dtype=np.uint8)
+    rows[:, 0] = 0  # no filter
+    rows[:, 1:] = image
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(filepath, 'wb') as fh:
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        fh.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        fh.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        fh.write(chunk(b"IEND", b""))
+
+def write_preview(args, verts, faces):
+    """Write the preview or contact sheet asked for in args"""
+    if args['preview_grid']:
+        verts, faces = coarsen(verts, faces, TILE_SAMPLES)
+        angles = grid_angles(args['preview_grid'])
+        image = contact_sheet(verts, faces, args['rotation_z'], args['preview_grid'],
+                              args['coin_diameter'], args['relief_depth'])
+        print(f"Contact sheet: rotate-x {angles[0]:g}..{angles[-1]:g} down, "
+              f"rotate-y {angles[0]:g}..{angles[-1]:g} across, step {args['preview_grid']:g}")
+    else:
+        verts, faces = coarsen(verts, faces, PREVIEW_SAMPLES)
+        image = render(verts, faces, relief.rotation_from_args(args),
+                       args['coin_diameter'], args['relief_depth'], PREVIEW_SAMPLES)
+    write_png(args['preview'], image)
+    return args['preview']
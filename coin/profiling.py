@@ -0,0 +1,142 @@
+"""
+Trace-event profiling for the coin scripts.
+
+--profile out.json turns it on: every span becomes a complete event in a
+Chrome/Perfetto trace file, written when the process exits. Spans carry
+the vertex, edge and face counts of their mesh before and after, and the
+peak of Python allocations (tracemalloc, which includes NumPy arrays)
+while they ran. When profiling is off spans cost next to nothing.
+
+Load the file in https://ui.perfetto.dev or chrome://tracing.
+"""
+
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+import tracemalloc
+import numpy as np
+
+_events = None
+_stack = []
+_origin = 0.0
+
+def start(filepath):
+    """Start recording; the trace is written to filepath at exit"""
+    global _events, _origin
+    _events = []
+    _origin = time.perf_counter()
+    tracemalloc.start()
+    atexit.register(write, filepath)
+
+def enabled():
+    return _events is not None
+
+def mesh_stats(mesh):
+    """Vertex, edge and face counts of a Blender object or a (verts, faces) pair"""
+    data = getattr(mesh, 'data', None)
+    if hasattr(data, 'polygons'):
+        return {'vertices': len(data.vertices), 'edges': len(data.edges), 'faces': len(data.polygons)}
+    if isinstance(mesh, tuple) and len(mesh) == 2:
+        verts, faces = mesh
+        faces = np.asarray(faces)
+        if faces.ndim != 2:
+            return None
+        edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+        edges = edges[:, 0].astype(np.int64) * len(verts) + edges[:, 1]
+        return {'vertices': len(verts), 'edges': len(np.unique(edges)), 'faces': len(faces)}
+    return None
+
+class Span:
+    """One timed region; use through span() or traced()"""
+
+    def __init__(self, name, mesh=None, cat='stage'):
+        self.name = name
+        self.mesh = mesh
+        self.after = None
+        self.cat = cat
+
+    def result(self, mesh):
+        """Mesh to report the after counts for, when it is not the one passed in"""
+        self.after = mesh
+
+    def __enter__(self):
+        if _events is None:
+            return self
+        self.before_stats = mesh_stats(self.mesh)
+
+        # Keep the enclosing span's peak before restarting the count for this one
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.peak = 0
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _events is None:
+            return False
+        end = time.perf_counter()
+        _stack.pop()
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+        args = {'py_peak_mb': round(peak / (1024 * 1024), 2)}
+        for when, stats in (('before', self.before_stats), ('after', mesh_stats(self.after or self.mesh))):
+            for key, value in (stats or {}).items():
+                args[f"{key}_{when}"] = value
+        if exc[0] is not None:
+            args['error'] = repr(exc[1])
+
+        _events.append({
+            'name': self.name,
+            'cat': self.cat,
+            'ph': 'X',
+            'ts': round((self.start - _origin) * 1e6, 1),
+            'dur': round((end - self.start) * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+        return False
+
+def span(name, mesh=None):
+    """Span for a pipeline stage working on mesh"""
+    return Span(name, mesh)
+
+def operator(name, mesh=None):
+    """Span for one Blender operator call"""
+    return Span(name, mesh, cat='operator')
+
+def traced(fn):
+    """Decorator giving every call of fn a stage span named after it
+
+    The first positional argument is taken as the mesh before, the return
+    value as the mesh after.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _events is None:
+            return fn(*args, **kwargs)
+        with Span(fn.__name__, args[0] if args else None) as s:
+            result = fn(*args, **kwargs)
+            s.result(result)
+        return result
+    return wrapper
+
+def write(filepath):
+    """Write the recorded events as a trace-event JSON file"""
+    if _events is None:
+        return
+    trace = {
+        'traceEvents': [{
+            'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+            'args': {'name': 'coin relief'},
+        }] + _events,
+        'displayTimeUnit': 'ms',
+    }
+    with open(filepath, 'w') as fh:
+        json.dump(trace, fh)
+    print(f"Profile written to {filepath}")
@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+"""
+Blender-free pipeline to convert a USDA or STL mesh to a bas-relief coin.
+
+Usage:
+    python3 relief.py --input model.usda --output coin.stl [options]
+
+Runs under a plain CPython with NumPy: parse_args -> import -> rotate/scale
+-> depth compress -> base -> STL. The Blender scripts in this directory use
+the same functions for their geometry and only keep Blender for import,
+booleans and export.
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import numpy as np
+
+import batch
+import cleanup
+import compose
+import decimate
+import heightmap
+import meshbuffer
+import meshcache
+import orient
+import profiling
+import slicer
+import terrace
+import threemf
+import usda
+
+# Identifies load_mesh output in the mesh cache
+IMPORTER_VERSION = f"relief-1/usda-{usda.VERSION}"
+
+# --combine modes of run(), the first being the default
+COMBINE = ('stitch', 'stream', 'merge')
+
+# Binary STL facet record
+STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+def parse_args(argv=None):
+    """Parse command line arguments (after '--' when run inside Blender)"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+
+    # Simple argument parsing
+    args = {
+        'input': None,
+        'output': 'coin_relief.stl',
+        'coin_diameter': 40.0,  # mm
+        'relief_depth': 2.0,     # mm
+        'rotation_x': 0.0,       # degrees
+        'rotation_y': 0.0,
+        'rotation_z': 0.0,
+        'samples': 512,          # resolution for relief map
+        'method': 'projection',  # or 'heightmap'
+        'compress': 'linear',    # or 'gradient': depth squash of the heightmap
+        'max_error': None,       # mm; mesh the heightmap adaptively to this vertical error
+        'cache_dir': meshcache.DEFAULT_DIR,  # None disables the import cache
+        'cache_size': meshcache.DEFAULT_MAX_MB,
+        'jobs': None,            # batch manifest (.json or .csv)
+        'combine': None,         # stitch (default), stream or merge; union in the Blender scripts
+        'cut': None,             # back cut: bisect, or the script's own (boolean/fill)
+        'cut_height': 0.0,       # mm above the lowest point
+        'profile': None,         # trace-event JSON output
+        'cull': False,           # only faces turned towards the viewer (Blender: only the visible front shell)
+        'tolerance': None,       # mm of geometric error allowed by decimation
+        'serve': None,           # Unix socket to serve jobs on
+        'preview': None,         # PNG of the coin face instead of the coin
+        'preview_grid': None,    # degrees between rotations on a preview contact sheet
+        'auto_orient': False,    # choose rotate-x/y from the mesh
+        'clean': False,          # weld seams and drop loose pieces after the import
+        'layer_height': None,    # mm; snap heights to print layers and merge the terraces
+        'layers': None,          # layout JSON of elements composited into one face
+        'back': None,            # mesh for the reverse face; may be the input again
+        'back_rotation_x': 0.0,  # degrees, for the reverse
+        'back_rotation_y': 0.0,
+        'back_rotation_z': 0.0,
+    }
+
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--input' and i + 1 < len(argv):
+            args['input'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--output' and i + 1 < len(argv):
+            args['output'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--diameter' and i + 1 < len(argv):
+            args['coin_diameter'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--depth' and i + 1 < len(argv):
+            args['relief_depth'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--rotate-x' and i + 1 < len(argv):
+            args['rotation_x'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--rotate-y' and i + 1 < len(argv):
+            args['rotation_y'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--rotate-z' and i + 1 < len(argv):
+            args['rotation_z'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--samples' and i + 1 < len(argv):
+            args['samples'] = int(argv[i + 1])
+            i += 2
+        elif argv[i] == '--method' and i + 1 < len(argv):
+            args['method'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--compress' and i + 1 < len(argv):
+            args['compress'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--max-error' and i + 1 < len(argv):
+            args['max_error'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--cache-dir' and i + 1 < len(argv):
+            args['cache_dir'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--cache-size' and i + 1 < len(argv):
+            args['cache_size'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--combine' and i + 1 < len(argv):
+            args['combine'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--cut' and i + 1 < len(argv):
+            args['cut'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--cut-height' and i + 1 < len(argv):
+            args['cut_height'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--profile' and i + 1 < len(argv):
+            args['profile'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--jobs' and i + 1 < len(argv):
+            args['jobs'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--tolerance' and i + 1 < len(argv):
+            args['tolerance'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--serve' and i + 1 < len(argv):
+            args['serve'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--preview' and i + 1 < len(argv):
+            args['preview'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--preview-grid' and i + 1 < len(argv):
+            args['preview_grid'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--layer-height' and i + 1 < len(argv):
+            args['layer_height'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--layers' and i + 1 < len(argv):
+            args['layers'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--back' and i + 1 < len(argv):
+            args['back'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--back-rotate-x' and i + 1 < len(argv):
+            args['back_rotation_x'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--back-rotate-y' and i + 1 < len(argv):
+            args['back_rotation_y'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--back-rotate-z' and i + 1 < len(argv):
+            args['back_rotation_z'] = float(argv[i + 1])
+            i += 2
+        elif argv[i] == '--clean':
+            args['clean'] = True
+            i += 1
+        elif argv[i] == '--auto-orient':
+            args['auto_orient'] = True
+            i += 1
+        elif argv[i] == '--cull':
+            args['cull'] = True
+            i += 1
+        elif argv[i] == '--no-cache':
+            args['cache_dir'] = None
+            i += 1
+        else:
+            i += 1
+
+    if args['method'] not in batch.METHODS:
+        print(f"Error: unknown --method '{args['method']}': use {' or '.join(batch.METHODS)}")
+        sys.exit(1)
+    return args
+
+def print_usage(command):
+    """Print usage and the shared option list"""
+    print("Error: --input <file.usda> is required")
+    print("\nUsage:")
+    print(f"  {command} --input model.usda [options]")
+    print(f"  {command} --jobs manifest.json [options]")
+    print(f"  {command} --layers layout.json [options]")
+    print("\nOptions:")
+    print("  --output <file.stl>    Output file, .stl or .3mf (default: coin_relief.stl)")
+    print("  --diameter <mm>        Coin diameter (default: 40.0)")
+    print("  --depth <mm>           Relief depth (default: 2.0)")
+    print("  --rotate-x <degrees>   Rotation around X axis (default: 0)")
+    print("  --rotate-y <degrees>   Rotation around Y axis (default: 0)")
+    print("  --rotate-z <degrees>   Rotation around Z axis (default: 0)")
+    print(f"  --samples <int>        Relief map resolution, at least {heightmap.MIN_SAMPLES} (default: 512)")
+    print("  --method <name>        Merged relief: projection or heightmap (default: projection)")
+    print("  --compress <mode>      Heightmap depth squash: linear, or gradient to flatten steps and")
+    print("                         large slopes while keeping fine detail (default: linear)")
+    print("  --max-error <mm>       Mesh the heightmap adaptively to this vertical error (e.g. 0.01)")
+    print("  --combine <mode>       stitch to build one solid from the heightmap, stream to write that")
+    print("                         solid to STL band by band in constant memory, or merge to put the")
+    print("                         relief on a base as overlapping shells for the slicer (default: stitch);")
+    print("                         the Blender scripts take union (default) and stitch")
+    print("  --back <file>          Reverse face, imported once when it is the input again")
+    print("                         (basrel3.py and relief.py only)")
+    print("  --back-rotate-x/y/z <degrees>")
+    print("                         Rotations of the reverse (--back-rotate-y 180: the input seen from behind)")
+    print("  --layers <file.json>   Composite several elements into one stitched face (see compose.py,")
+    print("                         relief.py only)")
+    print("  --layer-height <mm>    Snap heights to print layers (e.g. 0.12) and merge the flat terraces")
+    print("  --clean                Weld split vertices, drop bad faces and loose pieces after the import")
+    print("  --auto-orient          Choose rotate-x/y by scoring views of the mesh (rotate-z is kept)")
+    print("  --cull                 Only faces turned towards the viewer: relief.py rasterizes just those for")
+    print("                         stitch/stream; the Blender projections keep the front shell, which is open")
+    print("  --tolerance <mm>       Decimate the projected relief to this error (e.g. 0.05)")
+    print("  --cut <mode>           Back cut for projection: bisect (plane clip and cap), or the script's own")
+    print("                         (flat.py, proper.py and relief.py only)")
+    print("  --cut-height <mm>      Cut plane height above the lowest point, above 0 for bisect (default: 0)")
+    print(f"  --cache-dir <dir>      Import cache directory (default: {meshcache.DEFAULT_DIR})")
+    print(f"  --cache-size <MB>      Import cache size cap (default: {meshcache.DEFAULT_MAX_MB})")
+    print("  --no-cache             Always import the input file")
+    print("  --jobs <file>          Batch manifest, one coin per entry (.json or .csv)")
+    print("  --preview <file.png>   Only write a shaded low-resolution image of the coin face")
+    print("  --preview-grid <deg>   With --preview, a contact sheet of rotate-x/y from -90 to 90 in this step")
+    print("  --profile <file.json>  Write a Chrome/Perfetto trace of the run")
+    print("  --serve <socket>       Stay up and run jobs sent to this Unix socket (see coinserver.py)")
+
+def print_settings(args):
+    """Echo the settings of a run"""
+    print(f"Processing: {args['input'] or args['layers']}")
+    print(f"Coin diameter: {args['coin_diameter']}mm")
+    print(f"Relief depth: {args['relief_depth']}mm")
+    print(f"Rotation: X={args['rotation_x']}, Y={args['rotation_y']}, Z={args['rotation_z']}")
+    if args['back']:
+        print(f"Reverse: {args['back']}, rotation X={args['back_rotation_x']}, "
+              f"Y={args['back_rotation_y']}, Z={args['back_rotation_z']}")
+
+def rotation_from_args(args):
+    """Rotation dict in degrees as used by create_relief_from_projection"""
+    return {
+        'x': args['rotation_x'],
+        'y': args['rotation_y'],
+        'z': args['rotation_z']
+    }
+
+def back_args(args):
+    """Copy of args describing the reverse face: its input and rotation in place of the obverse's"""
+    return dict(args, input=args['back'], rotation_x=args['back_rotation_x'],
+                rotation_y=args['back_rotation_y'], rotation_z=args['back_rotation_z'])
+
+def auto_orient(args, verts, faces):
+    """Copy of args with rotate-x/y set to the best scoring view of the mesh"""
+    rotation = orient.best_rotation(verts, faces, args['rotation_z'])
+    print(f"Auto-orient: rotate-x {rotation['x']:g}, rotate-y {rotation['y']:g}")
+    return dict(args, rotation_x=rotation['x'], rotation_y=rotation['y'])
+
+# --- Import ---
+
+def load_stl(filepath):
+    """Read a binary or ASCII STL file, merging identical corners into shared vertices"""
+    with open(filepath, 'rb') as fh:
+        data = fh.read()
+
+    count = int(np.frombuffer(data, dtype='<u4', count=1, offset=80)[0]) if len(data) >= 84 else -1
+    if count >= 0 and len(data) == 84 + count * STL_DTYPE.itemsize:
+        records = np.frombuffer(data, dtype=STL_DTYPE, count=count, offset=84)
+        corners = records['vertices'].reshape(-1, 3).astype(np.float64)
+    else:
+        text = data.decode('ascii', errors='replace')
+        numbers = re.findall(r'vertex\s+(\S+)\s+(\S+)\s+(\S+)', text)
+        corners = np.array(numbers, dtype=np.float64).reshape(-1, 3)
+
+    verts, inverse = np.unique(corners, axis=0, return_inverse=True)
+    return verts, inverse.reshape(-1, 3)
+
+def load_mesh(filepath):
+    """Load vertices and triangles from a .usda or .stl file"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.usda':
+        return usda.read_usda(filepath)
+    if ext == '.stl':
+        return load_stl(filepath)
+    raise ValueError(f"Unsupported input format: {filepath}")
+
+def load_clean_mesh(filepath):
+    """load_mesh followed by cleanup.clean"""
+    verts, faces = load_mesh(filepath)
+    clean_verts, clean_faces = cleanup.clean(verts, faces)
+    print(f"Cleanup: {len(verts)} -> {len(clean_verts)} vertices, {len(faces)} -> {len(clean_faces)} triangles")
+    return clean_verts, clean_faces
+
+def import_mesh(args):
+    """Load the input mesh, cleaned up if asked, going through the import cache when enabled"""
+    loader = load_clean_mesh if args['clean'] else load_mesh
+    if args['cache_dir']:
+        version = f"{IMPORTER_VERSION}/clean-{cleanup.VERSION}" if args['clean'] else IMPORTER_VERSION
+        return meshcache.cached_import(args['input'], loader, version,
+                                       args['cache_dir'], args['cache_size'])
+    return loader(args['input'])
+
+# --- Geometry ---
+
+def rotation_matrix(rotation):
+    """3x3 matrix of Blender's XYZ Euler rotation given in degrees"""
+    x, y, z = (math.radians(rotation[axis]) for axis in ('x', 'y', 'z'))
+    rx = np.array([[1, 0, 0], [0, math.cos(x), -math.sin(x)], [0, math.sin(x), math.cos(x)]])
+    ry = np.array([[math.cos(y), 0, math.sin(y)], [0, 1, 0], [-math.sin(y), 0, math.cos(y)]])
+    rz = np.array([[math.cos(z), -math.sin(z), 0], [math.sin(z), math.cos(z), 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+def rotate(verts, rotation):
+    """Rotate vertices to get the desired view"""
+    return verts @ rotation_matrix(rotation).T
+
+def fit_scale(lo, hi, coin_diameter):
+    """Uniform scale that fits the larger XY extent of the bounds into 85% of the coin"""
+    max_dimension = max(hi[0] - lo[0], hi[1] - lo[1])
+    if max_dimension > 0:
+        return (coin_diameter * 0.85) / max_dimension
+    return 1.0
+
+def project_relief(buf, coin_diameter, relief_depth, rotation, cull=False, tolerance=None):
+    """Rotate, scale to the coin and compress depth of a MeshBuffer in place
+
+    The bounds are taken once after the rotation; scaling and depth
+    compression then happen in a single pass, keeping the lowest point
+    where the uniform scale puts it. With cull, faces hidden from the
+    viewer are dropped before the bounds are taken, so only the front
+    shell is compressed into relief_depth. With a tolerance in mm the
+    finished relief is decimated to that geometric error.
+    """
+    buf.transform(rotation_matrix(rotation))
+    if cull:
+        buf.keep_faces(heightmap.visible_faces(buf.verts, buf.faces))
+        if len(buf.faces) == 0:
+            raise ValueError("No faces visible from this rotation")
+    lo, hi = buf.bounds()
+    scale = fit_scale(lo, hi, coin_diameter)
+    depth = (hi[2] - lo[2]) * scale
+    z_scale = relief_depth / depth * scale if depth > 0 else scale
+    buf.scale((scale, scale, z_scale))
+    buf.verts[:, 2] += lo[2] * (scale - z_scale)
+    if tolerance:
+        buf.replace(*decimate.simplify(buf.verts, buf.faces, tolerance))
+    return buf
+
+def turn_over(mesh, thickness=3.0):
+    """Turn a relief half a turn about Y and lower it by thickness, onto the underside of the base"""
+    verts, faces = mesh
+    verts = np.array(verts, dtype=np.float64)
+    verts[:, 0] *= -1
+    verts[:, 2] = -thickness - verts[:, 2]
+    return verts, faces
+
+def coin_base(diameter, thickness=3.0, segments=128, top=0.0):
+    """Cylindrical coin base as triangle arrays, top face at Z=top"""
+    angles = np.arange(segments) * (2 * math.pi / segments)
+    ring = np.stack([np.cos(angles), np.sin(angles)], axis=1) * (diameter / 2)
+
+    verts = np.zeros((2 * segments + 2, 3))
+    verts[:segments, :2] = ring
+    verts[:segments, 2] = top
+    verts[segments:2 * segments, :2] = ring
+    verts[segments:2 * segments, 2] = top - thickness
+    verts[2 * segments] = (0, 0, top)
+    verts[2 * segments + 1] = (0, 0, top - thickness)
+
+    k = np.arange(segments)
+    k1 = (k + 1) % segments
+    top_center = np.full(segments, 2 * segments)
+    bottom_center = top_center + 1
+    faces = np.concatenate([
+        np.stack([k, k + segments, k1 + segments], axis=1),
+        np.stack([k, k1 + segments, k1], axis=1),
+        np.stack([top_center, k, k1], axis=1),
+        np.stack([bottom_center, k1 + segments, k + segments], axis=1),
+    ])
+    return verts, faces
+
+def merge_meshes(*meshes):
+    """Concatenate (verts, faces) pairs into one mesh"""
+    verts = []
+    faces = []
+    offset = 0
+    for v, f in meshes:
+        verts.append(v)
+        faces.append(np.asarray(f) + offset)
+        offset += len(v)
+    return np.concatenate(verts), np.concatenate(faces)
+
+# --- Export ---
+
+def _fill_normals(records):
+    """Set the facet normals of STL records from their vertices"""
+    tris = records['vertices']
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    records['normal'] = normals / np.where(lengths > 0, lengths, 1)
+
+def write_stl(filepath, verts, faces):
+    """Write triangles as binary STL in one buffered write"""
+    records = np.zeros(len(faces), dtype=STL_DTYPE)
+    np.take(np.asarray(verts, dtype=np.float32), faces, axis=0, out=records['vertices'])
+    _fill_normals(records)
+
+    with open(filepath, 'wb') as fh:
+        fh.write(b'coin relief'.ljust(80, b'\0'))
+        fh.write(np.uint32(len(records)).tobytes())
+        # The record array is written through the buffer protocol, without a copy
+        fh.write(records)
+
+def write_stl_bands(filepath, bands):
+    """Write binary STL from an iterable of (T, 3, 3) triangle arrays, one write per array
+
+    The triangle count is patched into the header at the end; returns it.
+    """
+    count = 0
+    with open(filepath, 'wb') as fh:
+        fh.write(b'coin relief'.ljust(80, b'\0'))
+        fh.write(np.uint32(0).tobytes())
+        for tris in bands:
+            records = np.zeros(len(tris), dtype=STL_DTYPE)
+            records['vertices'] = tris
+            _fill_normals(records)
+            fh.write(records)
+            count += len(records)
+        fh.seek(80)
+        fh.write(np.uint32(count).tobytes())
+    return count
+
+def write_mesh(filepath, verts, faces):
+    """Write triangles as 3MF when the path ends in .3mf, otherwise as binary STL"""
+    if os.path.splitext(filepath)[1].lower() == '.3mf':
+        threemf.write_3mf(filepath, verts, faces)
+    else:
+        write_stl(filepath, verts, faces)
+
+# --- Pipeline ---
+
+def view_mesh(mesh, args):
+    """(verts, faces) rotated to the view in args; with cull, only the faces turned towards the viewer
+
+    The heightmap keeps the frontmost surface anyway, so on a closed mesh
+    this only saves rasterizing the back; on an open scan it also stops
+    the inside of the back showing through holes in the front.
+    """
+    verts = rotate(mesh[0], rotation_from_args(args))
+    faces = np.asarray(mesh[1])
+    if args['cull']:
+        faces = faces[heightmap.front_faces(verts, faces)]
+        if len(faces) == 0:
+            raise ValueError("No faces visible from this rotation")
+    return verts, faces
+
+def check_projection(args):
+    """Raise ValueError for heightmap options given to the projection method"""
+    if args['compress'] != 'linear':
+        raise ValueError("--compress works on the heightmap: use --method heightmap or --combine stitch")
+    if args['max_error'] is not None:
+        raise ValueError("--max-error meshes the heightmap: use --method heightmap or --combine stitch")
+
+def make_relief(verts, faces, args):
+    """Relief mesh with its bottom on Z=0, using the method chosen in args"""
+    rotation = rotation_from_args(args)
+    if args['method'] == 'heightmap':
+        # Reach into the base so the two solids overlap
+        return heightmap.relief_solid(
+            rotate(verts, rotation), faces,
+            args['coin_diameter'], args['relief_depth'], args['samples'],
+            base_z=0.0, floor=-1.0, compression=args['compress'], max_error=args['max_error']
+        )
+    check_projection(args)
+
+    # The imported arrays may be shared with other jobs, so work on a copy
+    buf = project_relief(meshbuffer.MeshBuffer(verts, faces, copy=True),
+                         args['coin_diameter'], args['relief_depth'], rotation,
+                         cull=args['cull'], tolerance=args['tolerance'])
+    if args['cut'] == 'bisect':
+        return slicer.cut_back(buf.verts, buf.faces, args['cut_height'])
+    buf.translate((0, 0, -buf.verts[:, 2].min()))
+    return buf.arrays()
+
+def run(args, mesh=None):
+    """Run the whole pipeline for one parsed argument dict
+
+    mesh can pass an already imported (verts, faces) pair to skip the import.
+    """
+    heightmap.check_samples(args['samples'])
+    args = dict(args, combine=args['combine'] or COMBINE[0])
+    if args['combine'] not in COMBINE:
+        raise ValueError(f"Unknown --combine mode '{args['combine']}': use {', '.join(COMBINE)}")
+    if args['combine'] != 'merge':
+        merge_only = [flag for flag, given in (('--method', args['method'] != 'projection'), ('--cut', args['cut']),
+                                               ('--tolerance', args['tolerance']))
+                      if given]
+        if merge_only:
+            raise ValueError(f"{', '.join(merge_only)}: only with --combine merge")
+    elif args['cull']:
+        raise ValueError("--cull leaves an open front shell to merge: use --combine stitch")
+    if args['layers']:
+        return run_layers(args)
+
+    if mesh is None:
+        print("Importing mesh...")
+        with profiling.span("import") as span:
+            mesh = import_mesh(args)
+            span.result(mesh)
+    verts, faces = mesh
+    if len(faces) == 0:
+        raise ValueError("No faces found in input file")
+
+    back_mesh = None
+    if args['back'] and not args['preview']:
+        # Both faces come from one import when the reverse is the input seen another way
+        if os.path.abspath(args['back']) == os.path.abspath(args['input']):
+            back_mesh = mesh
+        else:
+            print("Importing reverse...")
+            with profiling.span("import") as span:
+                back_mesh = import_mesh(back_args(args))
+                span.result(back_mesh)
+
+    if args['auto_orient']:
+        args = auto_orient(args, verts, faces)
+
+    if args['preview']:
+        import preview
+        print(f"Writing preview to {args['preview']}...")
+        with profiling.span("preview", mesh):
+            return preview.write_preview(args, verts, faces)
+
+    if args['combine'] == 'stream':
+        # The stitched coin, generated and written band by band in constant memory
+        if os.path.splitext(args['output'])[1].lower() == '.3mf':
+            raise ValueError("--combine stream writes STL only")
+        if args['compress'] != 'linear':
+            raise ValueError("--combine stream compresses linearly; use --combine stitch")
+        if args['layer_height']:
+            raise ValueError("--layer-height needs the whole coin; use --combine stitch")
+        if args['max_error'] is not None:
+            raise ValueError("--combine stream writes the regular grid; use --combine stitch")
+        if back_mesh is not None:
+            raise ValueError("--combine stream writes one face; use --combine stitch")
+        print(f"Streaming stitched coin to {args['output']}...")
+        with profiling.span("stream", mesh):
+            bands = heightmap.coin_bands(
+                *view_mesh(mesh, args), args['coin_diameter'], args['relief_depth'], args['samples']
+            )
+            write_stl_bands(args['output'], bands)
+        return args['output']
+
+    if args['combine'] == 'stitch':
+        # One watertight solid straight from the heightmap, no separate base
+        print("Creating stitched coin from heightmap...")
+        with profiling.span("stitch", mesh) as span:
+            heights = heightmap.relief_heights(
+                *view_mesh(mesh, args), args['coin_diameter'], args['relief_depth'], args['samples'], args['compress']
+            )
+            back = None
+            if back_mesh is not None:
+                back = heightmap.relief_heights(
+                    *view_mesh(back_mesh, back_args(args)),
+                    args['coin_diameter'], args['relief_depth'], args['samples'], args['compress']
+                )
+            coin = heightmap.coin_solid(heights, args['coin_diameter'], max_error=args['max_error'], back=back)
+            span.result(coin)
+    else:
+        print("Creating bas-relief projection...")
+        with profiling.span("projection", mesh) as span:
+            relief = make_relief(verts, faces, args)
+            span.result(relief)
+
+        print("Creating coin base...")
+        with profiling.span("create_coin_base") as span:
+            base = coin_base(args['coin_diameter'])
+            span.result(base)
+
+        shells = [relief, base]
+        if back_mesh is not None:
+            print("Creating reverse...")
+            with profiling.span("reverse", back_mesh) as span:
+                reverse = turn_over(make_relief(*back_mesh, back_args(args)))
+                span.result(reverse)
+            shells.append(reverse)
+
+        # Overlapping shells, not a boolean union; slicers merge them
+        print("Merging relief with coin base...")
+        with profiling.span("combine", relief) as span:
+            coin = merge_meshes(*shells)
+            span.result(coin)
+
+    return export_coin(args, coin)
+
+def run_layers(args):
+    """Composite the elements of a layout into one face and stitch the coin from it"""
+    if args['back']:
+        raise ValueError("--back is not supported with --layers")
+    layers = compose.read_layout(args['layers'], args)
+    samples = args['samples']
+    if args['preview']:
+        import preview
+        samples = preview.PREVIEW_SAMPLES
+
+    print(f"Compositing {len(layers)} layers...")
+    with profiling.span("compose"):
+        heights = compose.compose(layers, args['coin_diameter'], samples, import_mesh)
+
+    if args['preview']:
+        print(f"Writing preview to {args['preview']}...")
+        preview.write_png(args['preview'], preview.shade(heights, args['coin_diameter']))
+        return args['preview']
+    if np.any(heights[np.isfinite(heights)] <= -3.0):
+        raise ValueError("Subtracted layers cut through the 3mm coin")
+
+    print("Creating stitched coin from heightmap...")
+    with profiling.span("stitch") as span:
+        coin = heightmap.coin_solid(heights, args['coin_diameter'], max_error=args['max_error'])
+        span.result(coin)
+    return export_coin(args, coin)
+
+def export_coin(args, coin):
+    """Terrace the finished coin if asked and write it to the output file"""
+    if args['layer_height']:
+        print(f"Terracing to {args['layer_height']}mm layers...")
+        with profiling.span("terrace", coin) as span:
+            coin = terrace.terrace(*coin, args['layer_height'])
+            span.result(coin)
+
+    print(f"Exporting to {args['output']}...")
+    with profiling.span("stl_export", coin):
+        write_mesh(args['output'], *coin)
+    return args['output']
+
+def run_jobs(jobs):
+    """Run a list of jobs, importing each distinct input once per clean setting; returns the failed jobs"""
+    failed = []
+    for (filepath, clean), group in batch.group_by_import(jobs).items():
+        print(f"Importing {filepath}{' (clean)' if clean else ''}...")
+        try:
+            mesh = import_mesh(group[0])
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            failed.extend(group)
+            continue
+
+        for job in group:
+            print_settings(job)
+            try:
+                run(job, mesh)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                failed.append(job)
+
+    print(f"Batch: {len(jobs) - len(failed)} of {len(jobs)} coins written")
+    return failed
+
+def input_stamp(filepath):
+    """Path, size and modification time, to tell whether an input changed since it was imported"""
+    stat = os.stat(filepath)
+    return (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+
+def job_runner():
+    """Job function for coinserver that keeps the last import in memory and returns stage timings"""
+    last = {}
+
+    def run_job(job):
+        start = time.perf_counter()
+        if job['layers']:
+            # Layouts import their own elements
+            run(job)
+            return {'run': time.perf_counter() - start}
+        key = (input_stamp(job['input']), job['clean'])
+        if key not in last:
+            last.clear()
+            last[key] = import_mesh(job)
+        imported = time.perf_counter()
+        run(job, last[key])
+        return {'import': imported - start, 'run': time.perf_counter() - imported}
+
+    return run_job
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args['profile']:
+        profiling.start(args['profile'])
+
+    if args['serve']:
+        import coinserver
+        coinserver.serve(args['serve'], job_runner(), args)
+        return
+
+    if args['jobs']:
+        try:
+            jobs = batch.read_manifest(args['jobs'], args)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sys.exit(1 if run_jobs(jobs) else 0)
+
+    if not args['input'] and not args['layers']:
+        print_usage("python3 relief.py")
+        sys.exit(1)
+
+    print_settings(args)
+
+    try:
+        run(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print("Done!")
+
+if __name__ == "__main__":
+    main()
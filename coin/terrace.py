@@ -0,0 +1,268 @@
+"""
+Layer-height terracing of coin meshes.
+
+A printer builds the relief from layers of a fixed height, so heights in
+between are lost in the slicer anyway. terrace() snaps every vertex to the
+nearest layer above the bed (the lowest point of the mesh), which turns
+most of the relief into flat terraces, and then merges each terrace into a
+few large triangles. The merge collapses vertices whose faces all lie flat
+on the same layer into one of their neighbours. A collapse happens only if
+every remaining face keeps its orientation and no edge ends up used other
+than once each way unless it already was, such as on an open border, so
+the surface does not change and the mesh stays as manifold as it came. Each round collapses an independent set of
+such vertices with whole-array passes over the faces that can still
+change, until rounds stop finding any.
+
+Usage:
+    python3 terrace.py model.stl 0.12
+"""
+
+import sys
+import numpy as np
+
+import cleanup
+
+# Upper bound on collapse rounds; each removes a large share of what is left
+MAX_ROUNDS = 200
+
+# Stop after rounds collapsing fewer vertices than the active faces over this
+TAIL = 1000
+
+# Rounds of picking per collapse round, for a near-maximal independent set
+PICK_PASSES = 2
+
+# Faces with a smaller doubled area in mm^2 after a collapse count as slivers
+MIN_AREA = 1e-10
+
+def quantize(verts, layer_height):
+    """Copy of verts with Z snapped to the nearest multiple of layer_height above the lowest point"""
+    verts = np.array(verts, dtype=np.float64).reshape(-1, 3)
+    if len(verts) == 0 or layer_height <= 0:
+        return verts
+    bed = verts[:, 2].min()
+    verts[:, 2] = bed + np.rint((verts[:, 2] - bed) / layer_height) * layer_height
+    return verts
+
+def _signed_areas(verts, faces):
+    """Doubled signed area of each face projected onto XY; positive when counter-clockwise from +Z"""
+    a = verts[faces[:, 0], :2]
+    b = verts[faces[:, 1], :2] - a
+    c = verts[faces[:, 2], :2] - a
+    return b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0]
+
+def _any_corner(mask, faces):
+    """Faces with at least one corner set in the per-vertex mask"""
+    return mask[faces[:, 0]] | mask[faces[:, 1]] | mask[faces[:, 2]]
+
+def _member(keys, query):
+    """Whether each query value occurs in the sorted array keys"""
+    at = np.minimum(np.searchsorted(keys, query), max(len(keys) - 1, 0))
+    return keys[at] == query if len(keys) else np.zeros(len(query), dtype=bool)
+
+def _edge_uses(faces, count):
+    """Undirected edges of faces as (low * count + high) keys, with their use count and forward uses
+
+    Sorting with the direction as the lowest bit puts each edge's uses side
+    by side.
+    """
+    start = faces.ravel()
+    end = faces[:, [1, 2, 0]].ravel()
+    low = np.minimum(start, end)
+    high = np.maximum(start, end)
+    tagged = np.sort((low * count + high) * 2 + (start < end))
+    edge = tagged >> 1
+    first = np.flatnonzero(np.r_[True, edge[1:] != edge[:-1]])
+    uses = np.diff(np.r_[first, len(edge)])
+    forward = np.add.reduceat(tagged & 1, first) if len(first) else first
+    return edge[first], uses, forward
+
+def _bad_edges(faces, count):
+    """Edges not used once each way, as sorted keys with their use count and forward uses"""
+    edge, uses, forward = _edge_uses(faces, count)
+    bad = (uses != 2) | (forward != 1)
+    return edge[bad], uses[bad], forward[bad]
+
+def _removable(verts, faces, area):
+    """Vertices whose faces all lie flat on their layer, facing one way, in a closed fan"""
+    count = len(verts)
+    corner_z = verts[faces, 2]
+    flat = (corner_z[:, 0] == corner_z[:, 1]) & (corner_z[:, 1] == corner_z[:, 2]) & (area != 0)
+    corner = faces.ravel()
+    face_of = np.repeat(np.arange(len(faces)), 3)
+
+    keep = np.bincount(corner, minlength=count) > 0
+    keep[corner[~flat[face_of]]] = False
+    up = np.bincount(corner, weights=(area > 0)[face_of], minlength=count)
+    keep &= (up == 0) | (up == np.bincount(corner, minlength=count))
+
+    # Every edge must be used once each way, or it lies on an open border,
+    # a seam or a non-manifold junction
+    bad = _bad_edges(faces, count)[0]
+    keep[bad // count] = False
+    keep[bad % count] = False
+    return keep
+
+def _collapse_round(verts, faces, removable, turn, rng):
+    """Collapse an independent set of removable vertices into a neighbour
+
+    faces must hold every face touching a removable vertex or one of its
+    neighbours. Returns the new faces, the removable vertices left and the
+    number collapsed.
+    """
+    count = len(verts)
+
+    # Pick vertices sharing no face with each other, so their collapses do
+    # not interact: those with the highest priority in all of their faces,
+    # then again among the ones not next to a pick yet
+    corner = faces.ravel()
+    face_of = np.repeat(np.arange(len(faces)), 3)
+    random = rng.random(count)
+    chosen = np.zeros(count, dtype=bool)
+    free = removable.copy()
+    for _ in range(PICK_PASSES):
+        priority = np.where(free, random, -1.0)
+        face_top = np.maximum(np.maximum(priority[faces[:, 0]], priority[faces[:, 1]]), priority[faces[:, 2]])
+        picked = free.copy()
+        picked[corner[face_top[face_of] != priority[corner]]] = False
+        chosen |= picked
+        free[faces[_any_corner(picked, faces)]] = False
+        if not free.any():
+            break
+
+    # Faces around each chosen vertex, grouped by vertex
+    rows = np.nonzero(chosen[corner])[0]
+    rows = rows[np.argsort(corner[rows], kind='stable')]
+    v = corner[rows]
+    f = face_of[rows]
+
+    # Target: the next corner in one of the vertex's faces, a different face each turn
+    degree = np.bincount(v, minlength=count)
+    first = np.cumsum(degree) - degree
+    pick = rows[first[chosen] + turn % degree[chosen]]
+    target = np.full(count, -1, dtype=np.int64)
+    target[chosen] = corner[pick // 3 * 3 + (pick % 3 + 1) % 3]
+
+    # The same faces with the vertex moved onto its target
+    w = target[v]
+    around = faces[f]
+    dropped = (around[:, 0] == w) | (around[:, 1] == w) | (around[:, 2] == w)
+    moved = around.copy()
+    moved[moved == v[:, None]] = w
+
+    # Every face that remains must keep its orientation and some area
+    new_area = _signed_areas(verts, moved)
+    flipped = ~dropped & (new_area * np.sign(_signed_areas(verts, around)) <= MIN_AREA)
+
+    # Link condition: the only neighbours v and w share are the corners
+    # opposite them in the two dropped faces, or the collapse pinches the mesh
+    is_target = np.zeros(count, dtype=bool)
+    is_target[w] = True
+    near_target = faces[_any_corner(is_target, faces)]
+    a = near_target.ravel()
+    b = near_target[:, [1, 2, 0]].ravel()
+    edge_keys = np.sort(np.minimum(a, b) * count + np.maximum(a, b))
+    opposite = np.full((count, 2), -1, dtype=np.int64)
+    tips = moved[dropped].copy()
+    tips[(tips == w[dropped, None])] = -1
+    dv = v[dropped]
+    side = np.zeros(len(dv), dtype=np.int64)
+    side[1:] = dv[1:] == dv[:-1]
+    opposite[dv, side] = np.maximum(np.maximum(tips[:, 0], tips[:, 1]), tips[:, 2])
+    others = moved[~dropped]
+    ov = v[~dropped]
+    ow = w[~dropped]
+    pinched = np.zeros(len(rows), dtype=bool)
+    for k in range(3):
+        u = others[:, k]
+        key = np.minimum(u, ow) * count + np.maximum(u, ow)
+        shared = (u != ow) & _member(edge_keys, key)
+        allowed = (u == opposite[ov, 0]) | (u == opposite[ov, 1])
+        pinched[np.nonzero(~dropped)[0][shared & ~allowed]] = True
+
+    # In a closed fan the target shares exactly two faces with the vertex
+    ok = chosen & (np.bincount(v[dropped], minlength=count) == 2)
+    ok[v[flipped | pinched]] = False
+
+    # The link check only looks at the tips of the dropped faces, so a fan
+    # next to an open border can still pinch. Every edge a collapse changes
+    # ends at its target, and the faces touching the targets hold all the
+    # uses of those edges: undo the collapses at any edge newly broken.
+    while ok.any():
+        remap = np.arange(count)
+        remap[ok] = target[ok]
+        new_faces = remap[faces]
+        new_faces = new_faces[(new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2])
+                              & (new_faces[:, 2] != new_faces[:, 0])]
+
+        is_target[:] = False
+        is_target[target[ok]] = True
+        old_edge, old_uses, old_forward = _bad_edges(faces[_any_corner(is_target, faces)], count)
+        edge, uses, forward = _bad_edges(new_faces[_any_corner(is_target, new_faces)], count)
+        at = np.minimum(np.searchsorted(old_edge, edge), max(len(old_edge) - 1, 0))
+        same = (old_edge[at] == edge) & (old_uses[at] == uses) & (old_forward[at] == forward) \
+            if len(old_edge) else np.zeros(len(edge), dtype=bool)
+        broken = edge[~same & (is_target[edge // count] | is_target[edge % count])]
+        if not len(broken):
+            return new_faces, removable & ~ok, int(ok.sum())
+        hit = np.zeros(count, dtype=bool)
+        hit[broken // count] = True
+        hit[broken % count] = True
+        undo = ok & hit[np.maximum(target, 0)]
+        if not undo.any():
+            break
+        ok &= ~undo
+    return faces, removable, 0
+
+def merge_flat(verts, faces, max_rounds=MAX_ROUNDS):
+    """Merge coplanar horizontal faces into larger triangles without changing the surface"""
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    rng = np.random.default_rng(0)
+    removable = _removable(verts, faces, _signed_areas(verts, faces))
+
+    # A collapse keeps the faces around its target flat, facing the same way
+    # and manifold, so vertices only ever stop being removable. Faces away
+    # from every removable vertex and its neighbours are final and set aside.
+    final = []
+    idle = 0
+    for turn in range(max_rounds):
+        near = removable.copy()
+        near[faces[_any_corner(removable, faces)]] = True
+        active = _any_corner(near, faces)
+        final.append(faces[~active])
+        faces, removable, collapsed = _collapse_round(verts, faces[active], removable, turn, rng)
+
+        # A vertex whose target failed tries another face on the next turn;
+        # stop once rounds hardly collapse anything
+        idle = idle + 1 if collapsed * TAIL < len(faces) else 0
+        if idle >= 3 or not removable.any():
+            break
+    faces = np.concatenate(final + [faces])
+
+    used = np.zeros(len(verts), dtype=bool)
+    used[faces] = True
+    remap = np.cumsum(used) - 1
+    return verts[used], remap[faces]
+
+def terrace(verts, faces, layer_height):
+    """Snap a mesh to layer_height and merge the flat terraces; returns float32 verts and int32 faces"""
+    # Weld the seams first; after snapping, distinct vertices can coincide
+    verts, faces = cleanup.weld(verts, faces, 0.0)
+    verts, faces = merge_flat(quantize(verts, layer_height), faces)
+    return verts.astype(np.float32), faces.astype(np.int32)
+
+def main():
+    import time
+    import relief
+
+    if len(sys.argv) < 3:
+        print("Usage: python3 terrace.py model.stl <layer height mm>")
+        sys.exit(1)
+
+    verts, faces = relief.load_mesh(sys.argv[1])
+    start = time.perf_counter()
+    out_verts, out_faces = terrace(verts, faces, float(sys.argv[2]))
+    print(f"{len(faces)} -> {len(out_faces)} triangles in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Regression tests for slicer.py: cuts through vertices lying on the plane
+and meshes with an open border.
+
+Run with:
+    python3 -m pytest test_slicer.py
+"""
+
+import numpy as np
+import pytest
+
+import slicer
+
+def open_edges(faces):
+    """Directed edges without a twin running the other way, and edges used twice the same way"""
+    faces = np.asarray(faces, dtype=np.int64)
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    count = int(faces.max()) + 1
+    keys = edges[:, 0] * count + edges[:, 1]
+    _, uses = np.unique(keys, return_counts=True)
+    twin = np.isin(keys, edges[:, 1] * count + edges[:, 0])
+    return int((uses > 1).sum() + (~twin).sum())
+
+def ringed_box():
+    """Closed unit-square column from Z=0 to Z=2 with a ring of vertices at Z=1"""
+    verts = np.array([(x, y, z) for z in (0, 1, 2) for x, y in ((0, 0), (1, 0), (1, 1), (0, 1))], dtype=np.float64)
+    faces = []
+    for ring in (0, 1):
+        for i in range(4):
+            a = ring * 4 + i
+            b = ring * 4 + (i + 1) % 4
+            faces += [(a, b, b + 4), (a, b + 4, a + 4)]
+    faces += [(0, 2, 1), (0, 3, 2), (8, 9, 10), (8, 10, 11)]
+    return verts, np.array(faces)
+
+def sphere(rows=40):
+    """Closed UV sphere of radius 1 around the origin"""
+    cols = 2 * rows
+    theta = np.linspace(0, np.pi, rows + 1)[1:-1]
+    phi = np.arange(cols) * (2 * np.pi / cols)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    verts = np.concatenate([
+        [(0, 0, 1)],
+        np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1).reshape(-1, 3),
+        [(0, 0, -1)],
+    ])
+    k = np.arange(cols)
+    k1 = (k + 1) % cols
+    bottom = len(verts) - 1
+    faces = [np.stack([np.zeros(cols, dtype=np.int64), 1 + k, 1 + k1], axis=1)]
+    for row in range(rows - 2):
+        a = 1 + row * cols
+        faces += [np.stack([a + k, a + cols + k, a + cols + k1], axis=1),
+                  np.stack([a + k, a + cols + k1, a + k1], axis=1)]
+    last = 1 + (rows - 2) * cols
+    faces.append(np.stack([np.full(cols, bottom), last + k1, last + k], axis=1))
+    return verts, np.concatenate(faces)
+
+def test_cut_through_vertex_ring():
+    verts, faces = ringed_box()
+    out_verts, out_faces = slicer.bisect_fill(verts, faces, (0, 0, 1), (0, 0, 1))
+    assert open_edges(out_faces) == 0
+    assert out_verts[:, 2].min() == 1.0
+    assert len(out_faces) == 12
+
+def test_cut_through_sphere_equator():
+    verts, faces = sphere()
+    out_verts, out_faces = slicer.cut_back(verts, faces, 1.0)
+    assert open_edges(out_faces) == 0
+    assert abs(out_verts[:, 2].min()) < 1e-9
+
+def test_cut_along_meridian():
+    verts, faces = sphere()
+    turned = verts[:, [0, 2, 1]] * (1, 1, -1)
+    out_verts, out_faces = slicer.cut_back(turned, faces, 1.0)
+    assert open_edges(out_faces) == 0
+
+def test_cut_height_must_be_positive():
+    verts, faces = ringed_box()
+    with pytest.raises(ValueError):
+        slicer.cut_back(verts, faces, 0.0)
+
+def test_open_border_away_from_cut():
+    verts, faces = ringed_box()
+    out_verts, out_faces = slicer.bisect_fill(verts, faces[:-2], (0, 0, 0.5), (0, 0, 1))
+    assert open_edges(out_faces) == 4
+
+def test_cut_across_open_border():
+    verts, faces = ringed_box()
+    with pytest.raises(ValueError):
+        slicer.bisect_fill(verts, faces[2:], (0, 0, 0.5), (0, 0, 1))
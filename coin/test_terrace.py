@@ -0,0 +1,41 @@
+"""
+Regression tests for terrace.py: merging terraces of meshes with an open border.
+
+Run with:
+    python3 -m pytest test_terrace.py
+"""
+
+import os
+
+import numpy as np
+
+import cleanup
+import meshbuffer
+import relief
+import slicer
+import terrace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def stepped_sheet(n=12):
+    """Open n x n grid sheet, one unit higher on its right half"""
+    x, y = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+    verts = np.stack([x.ravel(), y.ravel(), (x.ravel() > n // 2) * 1.0], axis=1)
+    a = (np.arange(n)[:, None] * (n + 1) + np.arange(n)).ravel()
+    faces = np.concatenate([np.stack([a, a + n + 1, a + n + 2], axis=1),
+                            np.stack([a, a + n + 2, a + 1], axis=1)])
+    return verts.astype(np.float64), faces
+
+def test_open_sheet_keeps_its_border():
+    verts, faces = stepped_sheet()
+    out_verts, out_faces = terrace.merge_flat(verts, faces)
+    assert len(out_faces) < len(faces)
+    assert slicer.open_edge_count(out_faces) == slicer.open_edge_count(faces)
+
+def test_open_relief_stays_manifold():
+    verts, faces = relief.load_mesh(os.path.join(HERE, "mark.usda"))
+    verts, faces = relief.project_relief(meshbuffer.MeshBuffer(verts, faces), 40.0, 2.0,
+                                         {'x': 0, 'y': 0, 'z': 0}).arrays()
+    verts, faces = cleanup.weld(verts, faces, 0.0)
+    out_verts, out_faces = terrace.merge_flat(terrace.quantize(verts, 0.12), faces)
+    assert slicer.open_edge_count(out_faces) == slicer.open_edge_count(faces)
@@ -0,0 +1,138 @@
+"""
+3MF writer for coin meshes.
+
+Writes a core-spec 3MF package (a zip holding one XML mesh with shared
+vertices, in millimetres) straight from vertex and triangle arrays. The
+XML text is produced by NumPy: numbers are rendered digit by digit into
+fixed-width byte columns, padding is dropped with one mask, and rows are
+streamed into the zip in chunks, so nothing is allocated per vertex or
+per triangle.
+
+Usage:
+    python3 threemf.py model.stl out.3mf
+"""
+
+import sys
+import zipfile
+import numpy as np
+
+# Rows rendered per chunk
+CHUNK_ROWS = 1 << 16
+
+# Digits after the decimal point; 0.1 micron is far below printer resolution
+DECIMALS = 4
+
+CONTENT_TYPES = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+
+RELS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+MODEL_HEAD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">
+ <resources>
+  <object id="1" type="model">
+   <mesh>
+    <vertices>
+"""
+
+MODEL_MIDDLE = b"""    </vertices>
+    <triangles>
+"""
+
+MODEL_TAIL = b"""    </triangles>
+   </mesh>
+  </object>
+ </resources>
+ <build>
+  <item objectid="1"/>
+ </build>
+</model>
+"""
+
+def _digits(values, width):
+    """Decimal digits of non-negative integers as (N, width) ASCII codes, most significant first"""
+    # 32-bit division is markedly faster and enough for up to nine digits
+    dtype = np.int32 if width <= 9 else np.int64
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=dtype)
+    return (values.astype(dtype)[:, None] // powers % 10 + ord('0')).astype(np.uint8)
+
+def _integers(values):
+    """Non-negative integers as (N, width) ASCII columns, 0 where padding"""
+    width = len(str(int(values.max()))) if len(values) else 1
+    cols = _digits(values, width)
+    # Leading zeros become padding, except the last digit
+    lead = np.cumsum(cols != ord('0'), axis=1) == 0
+    lead[:, -1] = False
+    cols[lead] = 0
+    return cols
+
+def _decimals(values, decimals=DECIMALS):
+    """Floats in fixed-point notation as (N, width) ASCII columns, 0 where padding
+
+    Trailing zeros of the fraction, and the point when nothing follows it,
+    are dropped.
+    """
+    scaled = np.rint(np.abs(values) * 10 ** decimals).astype(np.int64)
+    whole = _integers(scaled // 10 ** decimals)
+    frac = _digits(scaled % 10 ** decimals, decimals)
+
+    significant = np.flip(np.cumsum(np.flip(frac != ord('0'), axis=1), axis=1), axis=1) > 0
+    frac[~significant] = 0
+    point = np.where(significant[:, 0], ord('.'), 0).astype(np.uint8)[:, None]
+    sign = np.where((values < 0) & (scaled > 0), ord('-'), 0).astype(np.uint8)[:, None]
+    return np.concatenate([sign, whole, point, frac], axis=1)
+
+def _rows(parts, count):
+    """Join byte strings and (count, width) column blocks into text rows without padding"""
+    cols = []
+    for part in parts:
+        if isinstance(part, bytes):
+            part = np.broadcast_to(np.frombuffer(part, dtype=np.uint8), (count, len(part)))
+        cols.append(part)
+    block = np.concatenate(cols, axis=1).ravel()
+    return block[block != 0].tobytes()
+
+def _write_rows(fh, arrays, render):
+    """Render and write chunks of rows taken from parallel arrays"""
+    total = len(arrays[0])
+    for start in range(0, total, CHUNK_ROWS):
+        chunk = [a[start:start + CHUNK_ROWS] for a in arrays]
+        fh.write(render(*chunk))
+
+def write_3mf(filepath, verts, faces, compresslevel=1):
+    """Write a triangle mesh as a 3MF package"""
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES)
+        zf.writestr('_rels/.rels', RELS)
+        with zf.open('3D/3dmodel.model', 'w', force_zip64=True) as fh:
+            fh.write(MODEL_HEAD)
+            _write_rows(fh, (verts[:, 0], verts[:, 1], verts[:, 2]), lambda x, y, z: _rows([
+                b'     <vertex x="', _decimals(x), b'" y="', _decimals(y), b'" z="', _decimals(z), b'"/>\n',
+            ], len(x)))
+            fh.write(MODEL_MIDDLE)
+            _write_rows(fh, (faces[:, 0], faces[:, 1], faces[:, 2]), lambda a, b, c: _rows([
+                b'     <triangle v1="', _integers(a), b'" v2="', _integers(b), b'" v3="', _integers(c), b'"/>\n',
+            ], len(a)))
+            fh.write(MODEL_TAIL)
+
+def main():
+    import relief
+
+    if len(sys.argv) < 3:
+        print("Usage: python3 threemf.py model.stl out.3mf")
+        sys.exit(1)
+    write_3mf(sys.argv[2], *relief.load_mesh(sys.argv[1]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Streaming reader for the meshes of RealityKit Object Capture .usda files.
+
+Only points, faceVertexCounts and faceVertexIndices are read; materials,
+normals and texture coordinates are skipped without being parsed. The file
+is read in chunks and array values are tokenized straight into typed NumPy
+buffers, so peak memory stays close to the size of the final arrays.
+
+Usage:
+    python3 usda.py model.usda
+"""
+
+import re
+import sys
+import numpy as np
+
+# Bump when the reader output changes, to invalidate cached imports
+VERSION = 1
+
+CHUNK_SIZE = 1 << 18
+
+# Array attributes we keep, by the text in front of '= ['
+ATTRIBUTES = {
+    'point3f[] points': ('points', np.float32),
+    'int[] faceVertexCounts': ('counts', np.int32),
+    'int[] faceVertexIndices': ('indices', np.int32),
+}
+
+ARRAY_START = re.compile(r'=\s*\[')
+MESH_DEF = re.compile(r'\bdef\s+Mesh\b')
+UP_AXIS = re.compile(r'\bupAxis\s*=\s*"(\w)"')
+METERS_PER_UNIT = re.compile(r'\bmetersPerUnit\s*=\s*([-+0-9.eE]+)')
+
+# Tuple and list punctuation become whitespace for np.fromstring
+SEPARATORS = str.maketrans('(),', '   ')
+
+class _Buffer:
+    """Append-only typed array that grows in place"""
+
+    def __init__(self, dtype):
+        self.data = np.empty(4096, dtype=dtype)
+        self.size = 0
+
+    def extend(self, text):
+        values = np.fromstring(text.translate(SEPARATORS), dtype=self.data.dtype, sep=' ')
+        end = self.size + len(values)
+        if end > len(self.data):
+            self.data.resize(max(end, len(self.data) * 3 // 2), refcheck=False)
+        self.data[self.size:end] = values
+        self.size = end
+
+    def array(self):
+        self.data.resize(self.size, refcheck=False)
+        return self.data
+
+def triangulate(counts, indices):
+    """Fan-triangulate polygons given as per-face vertex counts and a flat index list"""
+    counts = np.asarray(counts)
+    indices = np.asarray(indices)
+    if len(counts) and (counts == 3).all():
+        return indices.reshape(-1, 3)
+
+    starts = np.cumsum(counts, dtype=np.int64) - counts
+    ntris = np.maximum(counts - 2, 0)
+    first = np.repeat(starts, ntris)
+    k = np.arange(ntris.sum()) - np.repeat(np.cumsum(ntris) - ntris, ntris) + 1
+    return np.stack([indices[first], indices[first + k], indices[first + k + 1]], axis=1)
+
+def _scan(text, stage, meshes):
+    """Pick up stage metadata and mesh definitions from non-array text"""
+    match = UP_AXIS.search(text)
+    if match:
+        stage['up_axis'] = match.group(1)
+    match = METERS_PER_UNIT.search(text)
+    if match:
+        stage['meters_per_unit'] = float(match.group(1))
+    for _ in MESH_DEF.finditer(text):
+        meshes.append({})
+
+def read_usda(filepath, chunk_size=CHUNK_SIZE):
+    """Read and join all meshes of a .usda file
+
+    Returns float32 vertices converted to Z-up and metres, like Blender's
+    USD importer, and int32 triangle indices.
+    """
+    stage = {'up_axis': 'Y', 'meters_per_unit': 1.0}
+    meshes = []
+    target = None      # buffer of the array being read, None when skipping it
+    in_array = False
+    pending = ''
+
+    with open(filepath, encoding='utf-8') as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            pending += chunk
+
+            while pending:
+                if in_array:
+                    end = pending.find(']')
+                    if end < 0:
+                        if not chunk:
+                            raise ValueError(f"Unterminated array in {filepath}")
+                        # Keep the last, possibly partial, number for the next chunk
+                        cut = pending.rfind(',') + 1
+                        if target is not None:
+                            target.extend(pending[:cut])
+                        pending = pending[cut:]
+                        break
+                    if target is not None:
+                        target.extend(pending[:end])
+                    pending = pending[end + 1:]
+                    in_array = False
+                    continue
+
+                match = ARRAY_START.search(pending)
+                if not match:
+                    # Leave the last partial line for the next chunk
+                    cut = pending.rfind('\n') + 1 if chunk else len(pending)
+                    _scan(pending[:cut], stage, meshes)
+                    pending = pending[cut:]
+                    break
+
+                prefix = pending[:match.start()]
+                _scan(prefix, stage, meshes)
+                name = prefix[prefix.rfind('\n') + 1:].strip()
+                target = None
+                if name in ATTRIBUTES and meshes:
+                    key, dtype = ATTRIBUTES[name]
+                    target = meshes[-1][key] = _Buffer(dtype)
+                in_array = True
+                pending = pending[match.end():]
+
+            if not chunk:
+                break
+
+    # Join all meshes into one
+    verts = []
+    faces = []
+    offset = 0
+    for mesh in meshes:
+        if not all(key in mesh for key in ('points', 'counts', 'indices')):
+            continue
+        points = mesh['points'].array().reshape(-1, 3)
+        tris = triangulate(mesh['counts'].array(), mesh['indices'].array())
+        verts.append(points)
+        faces.append(tris + offset if offset else tris)
+        offset += len(points)
+
+    if not verts:
+        raise ValueError(f"No mesh found in {filepath}")
+
+    verts = np.concatenate(verts) if len(verts) > 1 else verts[0]
+    faces = (np.concatenate(faces) if len(faces) > 1 else faces[0]).astype(np.int32, copy=False)
+
+    # Y-up stages are rotated 90 degrees about X: (x, y, z) -> (x, -z, y)
+    if stage['up_axis'] == 'Y':
+        y = verts[:, 1].copy()
+        verts[:, 1] = -verts[:, 2]
+        verts[:, 2] = y
+    if stage['meters_per_unit'] != 1.0:
+        verts *= stage['meters_per_unit']
+
+    return verts, faces
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 usda.py model.usda")
+        sys.exit(1)
+
+    verts, faces = read_usda(sys.argv[1])
+    print(f"Vertices: {len(verts)}")
+    print(f"Triangles: {len(faces)}")
+    print(f"Bounds: {verts.min(axis=0)} - {verts.max(axis=0)}")
+
+if __name__ == "__main__":
+    main()